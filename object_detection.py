@@ -1,7 +1,40 @@
 #!/usr/bin/env python
 
 
-from typing import List
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from json import JSONDecodeError, JSONDecoder
+from os import makedirs
+from os.path import dirname, isabs, join, normpath, pardir, sep, splitext
+from re import compile
+from struct import Struct
+from sys import modules
+from tempfile import TemporaryFile
+from typing import (IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple,
+                    Union)
+
+try:
+    import numpy
+except:
+    pass
+
+
+# Header of the packed label file written by coco2yolo_dataset: magic, format
+# version and number of records.
+PACKED_MAGIC = b'YOLOBX'
+PACKED_VERSION = 1
+PACKED_HEADER = Struct('<6sBQ')
+
+# Record of the packed label file: image id, class and YOLO bounding box.
+PACKED_RECORD = Struct('<qiffff')
+
+# Annotation spooled by coco2yolo_dataset until its image and the classes are
+# known: image id, COCO category id and COCO bounding box.
+_SPOOLED_ANNOTATION = Struct('<qqdddd')
+
+# Matches JSON whitespace.
+_WHITESPACE = compile(r'[ \t\n\r]*')
+
 
 class CocoBoundingBox(object):
     """A bounding box for an object in the COCO format.
@@ -36,137 +69,758 @@ class CocoBoundingBox(object):
         self.height = height
 
 
-def coco2yolo(bbox: CocoBoundingBox, img_w: int, img_h: int) -> List[float]:
+class BoxArray(object):
+    """Bounding boxes in the COCO format stored as one contiguous numpy array
+    per field instead of one object per box, so that whole batches can be
+    processed by vectorized operations.
+
+    Arrays that already have a suitable dtype are used as given, and indexing
+    with a slice returns a BoxArray of views, so neither copies the boxes.
+    Coordinates keep a floating point dtype they are given in and are stored
+    as float64 otherwise.
+
+    Arguments:
+        cls: Sequence[int]
+            The objects' classes
+        conf: Sequence[float]
+            The confidences in the objects' classes (between 0 and 1)
+        x_min: Sequence[float]
+            The bounding boxes' lowest x-coordinates
+        y_min: Sequence[float]
+            The bounding boxes' lowest y-coordinates
+        width: Sequence[float]
+            The bounding boxes' widths in pixels
+        height: Sequence[float]
+            The bounding boxes' heights in pixels
+
+    Raises:
+        ImportError: if numpy is not installed
+    """
+
+    FIELDS = ('cls', 'conf', 'x_min', 'y_min', 'width', 'height')
+
+    def __init__(self,
+                 cls: Sequence[int],
+                 conf: Sequence[float],
+                 x_min: Sequence[float],
+                 y_min: Sequence[float],
+                 width: Sequence[float],
+                 height: Sequence[float]) -> None:
+        if 'numpy' not in modules:
+            raise ImportError('numpy is required for BoxArray')
+        self.cls = numpy.asarray(cls, dtype=numpy.int64)
+        self.conf = self._column(conf)
+        self.x_min = self._column(x_min)
+        self.y_min = self._column(y_min)
+        self.width = self._column(width)
+        self.height = self._column(height)
+
+    @staticmethod
+    def _column(values: Sequence[float]) -> Any:
+        """Return values as a floating point numpy array, without copying
+        them if they already are one."""
+        values = numpy.asarray(values)
+        if values.dtype.kind != 'f':
+            values = values.astype(numpy.float64)
+        return values
+
+    @classmethod
+    def from_boxes(cls, bboxes: Sequence[CocoBoundingBox]) -> 'BoxArray':
+        """Build a BoxArray from a sequence of CocoBoundingBox objects.
+
+        Arguments:
+            bboxes: Sequence[CocoBoundingBox]
+                Input bounding boxes
+
+        Returns:
+            BoxArray: the same bounding boxes in the same order
+        """
+        return cls(*([getattr(bbox, field) for bbox in bboxes]
+                     for field in cls.FIELDS))
+
+    def to_boxes(self) -> List[CocoBoundingBox]:
+        """Return the bounding boxes as a list of CocoBoundingBox objects."""
+        return [CocoBoundingBox(*fields) for fields in zip(
+            *(getattr(self, field).tolist() for field in self.FIELDS))]
+
+    def __len__(self) -> int:
+        return len(self.cls)
+
+    def __getitem__(self, index: Any) -> Union[CocoBoundingBox, 'BoxArray']:
+        """Return the bounding box at an integer index as a CocoBoundingBox,
+        or the bounding boxes selected by a slice, boolean mask or index array
+        as a BoxArray, which shares memory with this one for a slice."""
+        if isinstance(index, (int, numpy.integer)):
+            return CocoBoundingBox(*(getattr(self, field)[index].item()
+                                     for field in self.FIELDS))
+        return BoxArray(*(getattr(self, field)[index]
+                          for field in self.FIELDS))
+
+
+def coco2yolo(bbox: Union[CocoBoundingBox, BoxArray],
+              img_w: int,
+              img_h: int) -> Union[List[float], Any]:
     """Take a CocoBoundingBox object and return an array of bounding box
     coordinates in the YOLO format.
 
     Arguments:
-        bbox: CocoBoundingBox
-            Input bounding box
+        bbox: Union[CocoBoundingBox, BoxArray]
+            Input bounding box, or bounding boxes
         img_w: int
-            Image width in pixels
+            Image width in pixels, or an array of one per box
         img_h: int
-            Image height in pixels
+            Image height in pixels, or an array of one per box
         
     Returns:
         List[float]: Yolo bounding box in the format
         [center x, center y, width, height], where all values are given as
-        fractions of the total width or height of the image
+        fractions of the total width or height of the image, or for a
+        BoxArray a numpy array with one such row per box
     """
     x_cntr = (bbox.x_min + bbox.width / 2) / img_w
     y_cntr = (bbox.y_min + bbox.height / 2) / img_h
     width = bbox.width / img_w
     height = bbox.height / img_h
+    if isinstance(bbox, BoxArray):
+        return numpy.stack([x_cntr, y_cntr, width, height], axis=1)
     return [x_cntr, y_cntr, width, height]
 
-def iou(bbox1: CocoBoundingBox, bbox2: CocoBoundingBox) -> float:
+def iou(bbox1: Union[CocoBoundingBox, BoxArray],
+        bbox2: Union[CocoBoundingBox, BoxArray]) -> Union[float, Any]:
     """Calculate the intersect over union (IoU) between two bounding boxes.
+
+    If either argument is a BoxArray the IoU is computed element-wise, with
+    numpy broadcasting, so a BoxArray can be compared to a single box.
     
     Arguments:
-        bbox1: CocoBoundingBox
+        bbox1: Union[CocoBoundingBox, BoxArray]
             Bounding Box 1
-        bbox2: CocoBoundingBox
+        bbox2: Union[CocoBoundingBox, BoxArray]
             Bounding Box 2
 
     Returns:
-        Float: IoU between bbox1 and bbox2
+        Float: IoU between bbox1 and bbox2, or a numpy array of them
     """
-    x_overlap = min(
-        max(bbox1.x_min + bbox1.width - bbox2.x_min, 0),
-        max(bbox2.x_min + bbox2.width - bbox1.x_min, 0))
-    y_overlap = min(
-        max(bbox1.y_min + bbox1.height - bbox2.y_min, 0),
-        max(bbox2.y_min + bbox2.height - bbox1.y_min, 0))
-    union = x_overlap * y_overlap
-    if union == 0:
+    if isinstance(bbox1, BoxArray) or isinstance(bbox2, BoxArray):
+        x_overlap = numpy.maximum(
+            numpy.minimum(bbox1.x_min + bbox1.width,
+                          bbox2.x_min + bbox2.width) -
+            numpy.maximum(bbox1.x_min, bbox2.x_min), 0)
+        y_overlap = numpy.maximum(
+            numpy.minimum(bbox1.y_min + bbox1.height,
+                          bbox2.y_min + bbox2.height) -
+            numpy.maximum(bbox1.y_min, bbox2.y_min), 0)
+        intersect = x_overlap * y_overlap
+        union = bbox1.width * bbox1.height + bbox2.width * bbox2.height - \
+            intersect
+        return numpy.divide(intersect, union, out=numpy.zeros_like(intersect),
+                            where=intersect > 0)
+    x_overlap = max(
+        min(bbox1.x_min + bbox1.width, bbox2.x_min + bbox2.width) -
+        max(bbox1.x_min, bbox2.x_min), 0)
+    y_overlap = max(
+        min(bbox1.y_min + bbox1.height, bbox2.y_min + bbox2.height) -
+        max(bbox1.y_min, bbox2.y_min), 0)
+    intersect = x_overlap * y_overlap
+    if intersect == 0:
         return 0
-    intersect = bbox1.width * bbox1.height + bbox2.width * bbox2.height - union
+    union = bbox1.width * bbox1.height + bbox2.width * bbox2.height - intersect
     return intersect / union
 
 
-def nms(bboxes: List[CocoBoundingBox], thresh: float) -> List[CocoBoundingBox]:
+def _corners(bboxes: BoxArray, dtype: Any) -> Tuple[Any, Any, Any, Any, Any]:
+    """Return the lowest and highest x and y-coordinates and the area of
+    bounding boxes as arrays of the given dtype."""
+    x_min = bboxes.x_min.astype(dtype, copy=False)
+    y_min = bboxes.y_min.astype(dtype, copy=False)
+    width = bboxes.width.astype(dtype, copy=False)
+    height = bboxes.height.astype(dtype, copy=False)
+    return x_min, y_min, x_min + width, y_min + height, width * height
+
+
+def _iou_tiles(bboxes1: BoxArray,
+               bboxes2: BoxArray,
+               dtype: Any,
+               tile_size: int) -> Iterator[Tuple[int, int, Any]]:
+    """Compute the IoU of every pair of bounding boxes one tile at a time.
+
+    Arguments:
+        bboxes1: BoxArray
+            Bounding boxes indexing the rows
+        bboxes2: BoxArray
+            Bounding boxes indexing the columns
+        dtype: numpy.dtype
+            Floating point type of the computation
+        tile_size: int
+            Number of rows and of columns of each tile
+
+    Returns:
+        Iterator[Tuple[int, int, numpy.ndarray]]: the first row, first column
+            and IoU of each tile of at most tile_size by tile_size pairs
+    """
+    x1, y1, x2, y2, area1 = _corners(bboxes1, dtype)
+    u1, v1, u2, v2, area2 = _corners(bboxes2, dtype)
+    for row in range(0, len(bboxes1), tile_size):
+        rows = slice(row, row + tile_size)
+        for col in range(0, len(bboxes2), tile_size):
+            cols = slice(col, col + tile_size)
+            x_overlap = numpy.minimum(x2[rows, None], u2[None, cols])
+            x_overlap -= numpy.maximum(x1[rows, None], u1[None, cols])
+            numpy.maximum(x_overlap, 0, out=x_overlap)
+            y_overlap = numpy.minimum(y2[rows, None], v2[None, cols])
+            y_overlap -= numpy.maximum(y1[rows, None], v1[None, cols])
+            numpy.maximum(y_overlap, 0, out=y_overlap)
+            intersect = x_overlap
+            intersect *= y_overlap
+            union = y_overlap
+            numpy.add(area1[rows, None], area2[None, cols], out=union)
+            union -= intersect
+            yield row, col, numpy.divide(
+                intersect, union, out=numpy.zeros_like(intersect),
+                where=intersect > 0)
+
+
+def iou_matrix(bboxes1: Union[List[CocoBoundingBox], BoxArray],
+               bboxes2: Union[List[CocoBoundingBox], BoxArray],
+               dtype: Any = None,
+               tile_size: int = 1024) -> Any:
+    """Calculate the intersect over union (IoU) between every bounding box of
+    bboxes1 and every bounding box of bboxes2.
+
+    The matrix is filled by broadcasting one tile of at most tile_size by
+    tile_size pairs at a time, so the temporaries stay small whatever the
+    number of boxes.  Passing numpy.float32 as dtype halves the memory
+    traffic at the cost of precision.
+
+    Arguments:
+        bboxes1: Union[List[CocoBoundingBox], BoxArray]
+            N bounding boxes
+        bboxes2: Union[List[CocoBoundingBox], BoxArray]
+            M bounding boxes
+        dtype: Optional[numpy.dtype]
+            Floating point type of the result, numpy.float64 by default
+        tile_size: int
+            Number of rows and of columns of each tile
+
+    Returns:
+        numpy.ndarray: N by M matrix of the IoU of each pair of boxes
+
+    Raises:
+        ImportError: if numpy is not installed
+    """
+    if 'numpy' not in modules:
+        raise ImportError('numpy is required for iou_matrix')
+    if not isinstance(bboxes1, BoxArray):
+        bboxes1 = BoxArray.from_boxes(bboxes1)
+    if not isinstance(bboxes2, BoxArray):
+        bboxes2 = BoxArray.from_boxes(bboxes2)
+    dtype = numpy.dtype(numpy.float64 if dtype is None else dtype)
+    matrix = numpy.empty((len(bboxes1), len(bboxes2)), dtype=dtype)
+    for row, col, tile in _iou_tiles(bboxes1, bboxes2, dtype, tile_size):
+        matrix[row:row + tile.shape[0], col:col + tile.shape[1]] = tile
+    return matrix
+
+
+def _nms_indices(bboxes: BoxArray, thresh: float, tile_size: int) -> Any:
+    """Return the indices of the bounding boxes kept by non-maximum
+    suppression in decreasing order of confidence.
+
+    The boxes are sorted by confidence and taken tile_size at a time.  The
+    boxes of a tile that overlap a box kept from an earlier tile are
+    suppressed first, then the remaining ones are resolved in order with the
+    IoU matrix of the tile.  The kept boxes are compared tile_size at a time
+    in order of x-coordinate, and only to the boxes of the tile that overlap
+    their x-range, which skips most pairs of boxes that cannot overlap.
+
+    Arguments:
+        bboxes: BoxArray
+            Bounding boxes to perform non-maximum suppression on
+        thresh: float
+            IoU threshold for dropping duplicate boxes
+        tile_size: int
+            Number of boxes resolved at once
+
+    Returns:
+        numpy.ndarray: indices into bboxes of the non-suppressed boxes
+    """
+    order = numpy.argsort(-bboxes.conf, kind='stable')
+    ranked = bboxes[order]
+    keep = numpy.zeros(len(ranked), dtype=bool)
+    for start in range(0, len(ranked), tile_size):
+        stop = min(start + tile_size, len(ranked))
+        tile = ranked[start:stop]
+        alive = numpy.ones(stop - start, dtype=bool)
+        kept = ranked[numpy.flatnonzero(keep[:start])]
+        kept = kept[numpy.argsort(kept.x_min, kind='stable')]
+        x_max = tile.x_min + tile.width
+        kept_x_max = kept.x_min + kept.width
+        for col in range(0, len(kept), tile_size):
+            cols = slice(col, col + tile_size)
+            near = alive
+            if thresh > 0:
+                near = alive & (tile.x_min < kept_x_max[cols].max()) & \
+                    (x_max > kept.x_min[col])
+            rows = numpy.flatnonzero(near)
+            if rows.size > 0:
+                alive[rows] &= ~(iou_matrix(tile[rows], kept[cols]) >=
+                                 thresh).any(axis=1)
+        ious = iou_matrix(tile, tile, tile_size=tile_size) >= thresh
+        for idx in numpy.flatnonzero(alive).tolist():
+            if alive[idx]:
+                keep[start + idx] = True
+                alive[idx + 1:] &= ~ious[idx, idx + 1:]
+    return order[keep]
+
+
+def nms(bboxes: Union[List[CocoBoundingBox], BoxArray],
+        thresh: float,
+        tile_size: int = 1024) -> Union[List[CocoBoundingBox], BoxArray]:
     """Perform non-maximum suppression on a list of bounding boxes.  I.e.,
     overlapping bounding boxes will be discarded.
+
+    Boxes are kept in decreasing order of confidence, the earliest one first
+    among equal confidences, and bboxes is not modified.  With numpy installed
+    the overlaps are computed tile by tile as in iou_matrix, see _nms_indices.
     
     Arguments:
-        bboxes: List[CocoBoundingBox]
+        bboxes: Union[List[CocoBoundingBox], BoxArray]
             List of bounding boxes to perform non-maximum suppression on
         thresh: float
             IoU threshold for dropping duplicate boxes
+        tile_size: int
+            Number of boxes resolved at once when numpy is installed
     
     Returns:
-        List[CocoBoundingBox]: List of non-suppressed bounding boxes
+        Union[List[CocoBoundingBox], BoxArray]: List of non-suppressed bounding
+            boxes, a BoxArray if bboxes is one
     """
-    bboxes.sort(key=lambda x: x.conf)
+    if isinstance(bboxes, BoxArray):
+        return bboxes[_nms_indices(bboxes, thresh, tile_size)]
+    if 'numpy' in modules:
+        return [bboxes[idx] for idx in _nms_indices(
+            BoxArray.from_boxes(bboxes), thresh, tile_size).tolist()]
+    bboxes = sorted(bboxes, key=lambda x: x.conf, reverse=True)
     filtered = []
     while len(bboxes) > 0:
-        filtered.append(bboxes.pop())
-        remaining = []
-        for bbox in enumerate(bboxes):
-            if iou(bbox, filtered[-1]) < thresh:
-                remaining.append(bbox)
-        bboxes = remaining
+        filtered.append(bboxes[0])
+        bboxes = [bbox for bbox in bboxes[1:]
+                  if iou(bbox, filtered[-1]) < thresh]
     return filtered
 
 
-def mean_average_precision(predicted: List[List[CocoBoundingBox]],
-                           ground_truth: List[List[CocoBoundingBox]],
-                           thresh: float) -> float:
-        """Return the mean average precision of a set of predicted bounding
-        boxes on a list of images against a set of ground truth bounding boxes
-        on the same list of images.
-        
-        Arguments:
-            predicted: List[List[CocoBoundingBox]]
-                List of lists of detected bounding boxes where each element in
-                the outer list corresponds to the predicted detections on a
-                unique image
-            ground_truth: List[List[CocoBoundingBox]]
-                List of lists of detected bounding boxes where each element in
-                the outer list corresponds to the ground truth detections on a
-                unique image
-            thresh: float
-                IoU threshold for detection
+def _average_precision(conf: Any, match: Any) -> float:
+    """Return the precision of a set of detections averaged over every
+    confidence threshold taken by one of them.
 
-        Returns:
-            float: the mean average precision of the predicted bounding boxes,
-            i.e., the #true positives / (#true positives + #false positives)
-            averaged across all confidence thresholds at a given IoU and across
-            all classes in the dataset
-        """
-        gt_cls = {}
-        for idx, img in enumerate(ground_truth):
-            for bbox in img:
-                if bbox.cls not in gt_cls:
-                    gt_cls[bbox.cls] = [[]] * (idx + 1)
-                gt_cls[bbox.cls][idx].append(bbox)
-        
+    Arguments:
+        conf: numpy.ndarray
+            Confidences of the detections
+        match: numpy.ndarray
+            Whether each detection matches a ground truth box
+
+    Returns:
+        float: the average precision, 0 if there are no detections
+    """
+    if conf.size == 0:
+        return 0.0
+    order = numpy.argsort(-conf, kind='stable')
+    conf = conf[order]
+    tp = numpy.cumsum(match[order])
+    last = numpy.flatnonzero(numpy.append(conf[1:] != conf[:-1], True))
+    return float((tp[last] / (last + 1)).mean())
+
+
+def mean_average_precision(
+        predicted: List[Union[List[CocoBoundingBox], BoxArray]],
+        ground_truth: List[Union[List[CocoBoundingBox], BoxArray]],
+        thresh: float) -> float:
+    """Return the mean average precision of a set of predicted bounding
+    boxes on a list of images against a set of ground truth bounding boxes
+    on the same list of images.
+
+    A detection is a true positive if it has an IoU of at least thresh with a
+    ground truth box of its class on the same image.  With numpy installed the
+    detections of each image are matched with one iou_matrix, and the
+    precision at every threshold is computed with a cumulative sum over the
+    detections sorted by confidence.
+    
+    Arguments:
+        predicted: List[Union[List[CocoBoundingBox], BoxArray]]
+            List of lists of detected bounding boxes where each element in
+            the outer list corresponds to the predicted detections on a
+            unique image
+        ground_truth: List[Union[List[CocoBoundingBox], BoxArray]]
+            List of lists of detected bounding boxes where each element in
+            the outer list corresponds to the ground truth detections on a
+            unique image
+        thresh: float
+            IoU threshold for detection
+
+    Returns:
+        float: the mean average precision of the predicted bounding boxes,
+        i.e., the #true positives / (#true positives + #false positives)
+        averaged across all confidence thresholds at a given IoU and across
+        all classes in the dataset
+    """
+    gt_count = Counter()
+    for img in ground_truth:
+        if isinstance(img, BoxArray):
+            gt_count.update(img.cls.tolist())
+        else:
+            gt_count.update(bbox.cls for bbox in img)
+    total = sum(gt_count.values())
+    if total == 0:
+        return 0.0
+
+    if 'numpy' not in modules:
         wtd_avg_prec = []
-        for cls in gt_cls:
-            conf_ts = set([c for c in i.conf for i in predicted])
+        for cls in gt_count:
+            detections = sorted(
+                ((pred_bbox.conf, any(
+                    gt_bbox.cls == cls and iou(gt_bbox, pred_bbox) >= thresh
+                    for gt_bbox in gt))
+                 for img, gt in zip(predicted, ground_truth)
+                 for pred_bbox in img if pred_bbox.cls == cls),
+                key=lambda x: x[0], reverse=True)
             prec = []
-            for conf in conf_ts:
-                tp = 0
-                fp = 0
-                for img, gt in zip(predicted, cls):
-                    for pred_bbox in img:
-                        if pred_bbox.conf >= conf and pred_bbox.cls == cls:
-                            match = False
-                            for gt_bbox in gt:
-                                if iou(gt_bbox, pred_bbox) >= thresh:
-                                    match = True
-                                    break
-                            tp += match
-                            fp += not match
-                prec.append(tp / (tp + fp))
-            cls_weight = sum([len(bxs) for bxs in gt_cls[cls]]) / \
-                sum([sum([len(bxs) for bxs in gt_cls[c]]) for c in gt_cls])
-            wtd_avg_prec.append( cls_weight * sum(prec) / len(prec))
+            tp = 0
+            for idx, (conf, match) in enumerate(detections):
+                tp += match
+                if idx + 1 == len(detections) or \
+                        detections[idx + 1][0] != conf:
+                    prec.append(tp / (idx + 1))
+            if len(prec) > 0:
+                wtd_avg_prec.append(
+                    gt_count[cls] / total * sum(prec) / len(prec))
         return sum(wtd_avg_prec)
 
+    conf = []
+    cls = []
+    match = []
+    for img, gt in zip(predicted, ground_truth):
+        if not isinstance(img, BoxArray):
+            img = BoxArray.from_boxes(img)
+        if not isinstance(gt, BoxArray):
+            gt = BoxArray.from_boxes(gt)
+        found = ((img.cls[:, None] == gt.cls[None, :]) &
+                 (iou_matrix(img, gt) >= thresh)).any(axis=1)
+        conf.append(img.conf)
+        cls.append(img.cls)
+        match.append(found)
+    conf = numpy.concatenate(conf + [numpy.empty(0)])
+    cls = numpy.concatenate(cls + [numpy.empty(0, dtype=numpy.int64)])
+    match = numpy.concatenate(match + [numpy.empty(0, dtype=bool)])
+    return sum(count / total * _average_precision(conf[cls == c],
+                                                  match[cls == c])
+               for c, count in gt_count.items())
+
+
+class _JsonMembers(object):
+    """Incremental reader of the members of a JSON object, which yields the
+    elements of the array members named in streamed one at a time so that
+    the document is never held in memory at once.
+
+    Arguments:
+        f: IO[str]
+            File holding the JSON object
+        streamed: Sequence[str]
+            Names of the array members to stream element by element
+        chunk_size: int
+            Number of characters read from f at once
+    """
+
+    def __init__(self,
+                 f: IO[str],
+                 streamed: Sequence[str],
+                 chunk_size: int) -> None:
+        self.f = f
+        self.streamed = streamed
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Append the next chunk of f to the unread part of the buffer, and
+        return False at the end of f."""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Skip whitespace and return the next character, or '' at the end of
+        f."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def _expect(self, char: str) -> None:
+        """Consume char, which must be the next character."""
+        if self._peek() != char:
+            raise ValueError('Expected {!r} at {!r}'.format(
+                char, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+
+    def _value(self) -> Any:
+        """Decode the next JSON value, reading more of f until it is complete.
+        A value ending with the buffer may be a truncated number, so it is
+        only accepted at the end of f."""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        """Yield (name, element) for every element of the streamed array
+        members and (name, value) for the other members, in file order."""
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key in self.streamed and self._peek() == '[':
+                self.pos += 1
+                if self._peek() != ']':
+                    while True:
+                        yield key, self._value()
+                        if self._peek() != ',':
+                            break
+                        self.pos += 1
+                self._expect(']')
+            else:
+                yield key, self._value()
+            if self._peek() != ',':
+                break
+            self.pos += 1
+        self._expect('}')
+
+
+def _convert_block(block: List[Tuple[int, int, float, float, float, float]],
+                   images: Dict[int, Tuple[int, int, str]]
+                   ) -> List[List[float]]:
+    """Convert a block of COCO annotations to YOLO bounding boxes, with one
+    vectorized coco2yolo call on a BoxArray if numpy is installed.
+
+    Arguments:
+        block: List[Tuple[int, int, float, float, float, float]]
+            Image id, class, x_min, y_min, width and height of each annotation
+        images: Dict[int, Tuple[int, int, str]]
+            Width, height and label file name of each image by id
+
+    Returns:
+        List[List[float]]: the YOLO bounding box of each annotation
+    """
+    if 'numpy' not in modules:
+        return [coco2yolo(CocoBoundingBox(cls, 1.0, x, y, w, h),
+                          *images[image_id][:2])
+                for image_id, cls, x, y, w, h in block]
+    columns = numpy.array([annotation[2:] for annotation in block],
+                          dtype=numpy.float64).reshape(-1, 4)
+    sizes = numpy.array([images[annotation[0]][:2] for annotation in block],
+                        dtype=numpy.float64).reshape(-1, 2)
+    bboxes = BoxArray(numpy.zeros(len(block), dtype=numpy.int64),
+                      numpy.ones(len(block)), *columns.T)
+    return coco2yolo(bboxes, sizes[:, 0], sizes[:, 1]).tolist()
+
+
+def _yolo_class(annotation: Tuple[int, int, float, float, float, float],
+                classes: Optional[Dict[int, int]]
+                ) -> Tuple[int, int, float, float, float, float]:
+    """Replace the COCO category id of an annotation by its YOLO class index.
+
+    Arguments:
+        annotation: Tuple[int, int, float, float, float, float]
+            Image id, category id, x_min, y_min, width and height
+        classes: Optional[Dict[int, int]]
+            YOLO class index of each category id, or None if no categories
+            are known
+
+    Returns:
+        Tuple[int, int, float, float, float, float]: the annotation with the
+            class index in place of the category id
+    """
+    if classes is None or annotation[1] not in classes:
+        raise ValueError('annotation refers to unknown category id {}'
+                         .format(annotation[1]))
+    return (annotation[0], classes[annotation[1]], *annotation[2:])
+
+
+def _write_labels(path: str, lines: List[str], append: bool) -> None:
+    """Write lines to the label file at path, appending if append is True
+    and creating its directory otherwise."""
+    if not append:
+        makedirs(dirname(path), exist_ok=True)
+    with open(path, 'a' if append else 'w') as f:
+        f.writelines(lines)
+
+
+def coco2yolo_dataset(annotations: str,
+                      destination: str,
+                      packed: bool = False,
+                      block_size: int = 1 << 16,
+                      threads: int = 4,
+                      chunk_size: int = 1 << 20,
+                      classes: Optional[Dict[int, int]] = None) -> int:
+    """Convert every bounding box of a COCO annotation file to the YOLO
+    format.
+
+    The file is parsed incrementally and annotations are converted in blocks
+    of block_size with coco2yolo, so memory use depends on the number of
+    images but not on the number of annotations.  Annotations that precede
+    their image, or the categories, in the file are spooled to a temporary
+    file and converted at the end, and a ValueError naming the id is raised if
+    one refers to an image or category that is not in the file at all.
+
+    YOLO classes are contiguous indices from 0, so unless classes maps each
+    COCO category id to its class index, the ids of the categories member are
+    numbered 0 to nc - 1 in ascending order.
+
+    Unless packed is True, destination is a directory that receives one
+    label file per annotated image, at the relative path of the image file
+    with a .txt extension, holding one 'class center_x center_y width height'
+    line per box, and a ValueError is raised if two images would share a
+    label file or one lies outside destination.  The files of each block are written by a pool of threads while the
+    next block is parsed.  If packed is True, destination is a single binary
+    file holding PACKED_HEADER followed by one PACKED_RECORD per box.
+
+    Arguments:
+        annotations: str
+            Path of the COCO annotation file
+        destination: str
+            Directory of the label files, or path of the packed label file
+        packed: bool
+            Whether to write a single packed binary file
+        block_size: int
+            Number of annotations converted at once
+        threads: int
+            Number of threads writing label files
+        chunk_size: int
+            Number of characters of the annotation file read at once
+        classes: Optional[Dict[int, int]]
+            YOLO class index of each COCO category id, or None to number the
+            categories of the file in order of their ids
+
+    Returns:
+        int: the number of bounding boxes converted
+    """
+    images = {}
+    labels = {}
+    written = set()
+    numbered = classes is None
+    pending = []
+    count = 0
+    if packed:
+        output = open(destination, 'wb')
+        output.write(PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, 0))
+    else:
+        makedirs(destination, exist_ok=True)
+        executor = ThreadPoolExecutor(max_workers=threads)
+
+    def flush(block: List[Tuple[int, int, float, float, float, float]]
+              ) -> None:
+        nonlocal pending, count
+        yolo = _convert_block(block, images)
+        count += len(block)
+        if packed:
+            output.write(b''.join(
+                PACKED_RECORD.pack(annotation[0], annotation[1], *bbox)
+                for annotation, bbox in zip(block, yolo)))
+            return
+        lines = defaultdict(list)
+        for annotation, bbox in zip(block, yolo):
+            lines[annotation[0]].append('{} {:.6f} {:.6f} {:.6f} {:.6f}\n'
+                                        .format(annotation[1], *bbox))
+        for future in pending:
+            future.result()
+        pending = [executor.submit(_write_labels,
+                                   join(destination, images[image_id][2]),
+                                   image_lines, image_id in written)
+                   for image_id, image_lines in lines.items()]
+        written.update(lines)
+
+    try:
+        with open(annotations, encoding='utf-8') as f, \
+                TemporaryFile() as spool:
+            block = []
+            spooled = 0
+            for key, value in _JsonMembers(f, ('images', 'annotations'),
+                                           chunk_size):
+                if key == 'images':
+                    label = normpath(splitext(value['file_name'])[0] + '.txt')
+                    if not packed and (isabs(label) or
+                                       label.startswith(pardir + sep)):
+                        raise ValueError('image file {} is outside the '
+                                         'dataset'.format(value['file_name']))
+                    if not packed and labels.setdefault(
+                            label, value['id']) != value['id']:
+                        raise ValueError('images {} and {} share the label '
+                                         'file {}'.format(labels[label],
+                                                          value['id'], label))
+                    images[value['id']] = (value['width'], value['height'],
+                                           label)
+                elif key == 'categories' and numbered:
+                    classes = {category: index for index, category in
+                               enumerate(sorted(c['id'] for c in value))}
+                elif key == 'annotations':
+                    annotation = (value['image_id'], value['category_id'],
+                                  *value['bbox'])
+                    if annotation[0] not in images or classes is None:
+                        spool.write(_SPOOLED_ANNOTATION.pack(*annotation))
+                        spooled += 1
+                        continue
+                    block.append(_yolo_class(annotation, classes))
+                    if len(block) == block_size:
+                        flush(block)
+                        block = []
+            if block:
+                flush(block)
+            spool.seek(0)
+            while spooled > 0:
+                size = min(spooled, block_size)
+                block = list(_SPOOLED_ANNOTATION.iter_unpack(
+                    spool.read(size * _SPOOLED_ANNOTATION.size)))
+                for annotation in block:
+                    if annotation[0] not in images:
+                        raise ValueError('annotation refers to unknown image '
+                                         'id {}'.format(annotation[0]))
+                flush([_yolo_class(annotation, classes)
+                       for annotation in block])
+                spooled -= size
+        if packed:
+            output.seek(0)
+            output.write(PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION,
+                                            count))
+        else:
+            for future in pending:
+                future.result()
+    finally:
+        if packed:
+            output.close()
+        else:
+            executor.shutdown()
+    return count
+
 
 if __name__ == '__main__':
     bbox = CocoBoundingBox(1, 0.8, 100, 200, 300, 400)
+    bboxes = [bbox,
+              CocoBoundingBox(1, 0.9, 120, 220, 300, 400),
+              CocoBoundingBox(1, 0.7, 500, 100, 100, 100),
+              CocoBoundingBox(2, 0.6, 110, 210, 280, 380)]
 
     # Problem 1:
     # Write a function that takes a bounding box object in the COCO bounding
@@ -178,14 +832,16 @@ if __name__ == '__main__':
     # Problem 2:
     # Write a function that calculates the intersect over union (IoU) for two
     # bounding boxes.
-    print('Problem #2:\n{}'.format())
+    print('Problem #2:\n{}'.format(iou(bboxes[0], bboxes[1])))
 
     # Problem 3:
     # Write a function that calculates that performs non-maximum supression
     # on a list of bounding boxes.
-    print('Problem #3:\n{}'.format())
+    print('Problem #3:\n{}'.format(
+        [vars(kept) for kept in nms(bboxes, 0.5)]))
 
     # Problem 4:
     # Write a function that calculates mean average precision on a list of
     # proposed bounding boxes and their ground truths.
-    print('Problem #4:\n{}'.format())
\ No newline at end of file
+    print('Problem #4:\n{}'.format(
+        mean_average_precision([bboxes], [[bbox, bboxes[3]]], 0.5)))
@@ -1,112 +1,809 @@
 #/usr/bin/env python
 
 
-from math import log2
-from typing import List
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import accumulate, chain, compress, repeat
+from math import isqrt
+from mmap import ACCESS_READ, mmap
+from os import cpu_count, fstat
+from os.path import exists
+from struct import Struct
+from sys import modules
+from time import perf_counter
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 
 
-def get_primes(n: int) -> List[int]:
+try:
+    import numpy
+except:
+    pass
+
+
+# Number of odd integers covered by one window of the segmented sieve.  One
+# byte per odd integer keeps each window at 256 KiB, which fits in a typical
+# L2 cache.
+SEGMENT_SIZE = 1 << 18
+
+# Bases for which the Miller-Rabin test is deterministic below
+# MILLER_RABIN_LIMIT, about 3.3 * 10^24.
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+MILLER_RABIN_LIMIT = 3317044064679887385961981
+
+# A range is tested with Miller-Rabin instead of sieved when sqrt of its upper
+# bound, the size of the base sieve, exceeds its number of odd candidates by
+# more than this factor, and its upper bound is at most MILLER_RABIN_LIMIT.
+MILLER_RABIN_RATIO = 16
+
+
+def _odd_sieve(n: int) -> bytearray:
+    """Sieve of Eratosthenes over the odd integers less than n.
+
+    Index i of the returned bytearray represents the integer 2 * i + 1 and is
+    1 if that integer is prime, otherwise 0.
+
+    Arguments:
+        n: int
+            Upper bound (exclusive) of the sieve
+
+    Returns:
+        bytearray: odd-only primality flags for the integers less than n
+    """
+    size = max(n // 2, 0)
+    sieve = bytearray([1]) * size
+    if size > 0:
+        sieve[0] = 0
+    for i in range(1, (isqrt(max(n - 1, 0)) + 1) // 2):
+        if sieve[i]:
+            p = 2 * i + 1
+            start = p * p // 2
+            sieve[start::p] = bytes(len(range(start, size, p)))
+    return sieve
+
+
+def _sieve_segment(lo: int, hi: int, base_primes: List[int]) -> bytearray:
+    """Sieve the odd integers in the window [lo, hi).
+
+    Index i of the returned bytearray represents the integer lo + 2 * i, where
+    lo must be odd.  base_primes must contain every odd prime p with
+    p * p < hi.
+
+    Arguments:
+        lo: int
+            Odd lower bound (inclusive) of the window
+        hi: int
+            Upper bound (exclusive) of the window
+        base_primes: List[int]
+            Odd primes used to cross off composites in the window
+
+    Returns:
+        bytearray: odd-only primality flags for the window
+    """
+    size = max((hi - lo + 1) // 2, 0)
+    segment = bytearray([1]) * size
+    for p in base_primes:
+        if p * p >= hi:
+            break
+        start = max(p * p, (lo + p - 1) // p * p)
+        if start % 2 == 0:
+            start += p
+        start = (start - lo) // 2
+        segment[start::p] = bytes(len(range(start, size, p)))
+    if lo == 1 and size > 0:
+        segment[0] = 0
+    return segment
+
+
+def _unpack(sieve: bytearray, lo: int) -> Iterator[int]:
+    """Yield the primes flagged in an odd-only sieve whose index 0 is lo.
+
+    Arguments:
+        sieve: bytearray
+            Odd-only primality flags
+        lo: int
+            Integer represented by index 0 of the sieve
+
+    Returns:
+        Iterator[int]: the primes flagged in the sieve in ascending order
+    """
+    return (lo + 2 * i for i in compress(range(len(sieve)), sieve))
+
+
+class PrimeCache(object):
+    """An odd-only sieve bitmap persisted to a file and memory-mapped so that
+    later runs, and other processes, can reuse it instead of sieving again.
+
+    The file holds a header (magic, format version and the exclusive bound of
+    the sieved range) followed by one byte per odd integer in the same layout
+    as _odd_sieve.  A file with a different magic or version, or one that is
+    shorter than its header claims, is discarded and rebuilt.
+
+    Arguments:
+        path: str
+            Location of the cache file, created on first use
+    """
+
+    MAGIC = b'PRIMESV'
+    VERSION = 1
+    HEADER = Struct('<7sBQ')
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.limit = 0
+        self._map = None
+        if not exists(path):
+            return
+        with open(path, 'rb') as f:
+            header = f.read(self.HEADER.size)
+            size = fstat(f.fileno()).st_size
+        if len(header) < self.HEADER.size:
+            return
+        magic, version, limit = self.HEADER.unpack(header)
+        if magic == self.MAGIC and version == self.VERSION and \
+                size >= self.HEADER.size + limit // 2:
+            self.limit = limit
+            self._remap()
+
+    def _remap(self) -> None:
+        """Memory-map the cache file read-only."""
+        with open(self.path, 'rb') as f:
+            self._map = mmap(f.fileno(), 0, access=ACCESS_READ)
+
+    def _extend(self, n: int) -> None:
+        """Sieve the integers from the current limit up to n and append their
+        flags to the cache file.
+
+        Arguments:
+            n: int
+                New upper bound (exclusive) of the cache
+        """
+        mode = 'r+b' if self.limit > 0 else 'wb'
+        base_primes = list(_unpack(_odd_sieve(isqrt(n - 1) + 1), 1))
+        with open(self.path, mode) as f:
+            if self.limit == 0:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, 0))
+            f.seek(self.HEADER.size + self.limit // 2)
+            f.truncate()
+            for lo in range(self.limit // 2 * 2 + 1, n, 2 * SEGMENT_SIZE):
+                hi = min(lo + 2 * SEGMENT_SIZE, n)
+                f.write(_sieve_segment(lo, hi, base_primes))
+            f.seek(0)
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, n))
+        self.limit = n
+        self._remap()
+
+    def flags(self, n: int) -> memoryview:
+        """Return the odd-only primality flags of the integers less than n,
+        extending the cache file first if it does not reach n.
+
+        The file grows at least geometrically so that a series of increasing
+        requests costs about as much as sieving the largest one once.
+
+        Arguments:
+            n: int
+                Upper bound (exclusive) of the flags
+
+        Returns:
+            memoryview: zero-copy view where index i represents 2 * i + 1
+        """
+        if n > self.limit:
+            self._extend(max(n, 2 * self.limit))
+        if self._map is None:
+            return memoryview(b'')
+        start = self.HEADER.size
+        return memoryview(self._map)[start:start + max(n // 2, 0)]
+
+
+def _pack(chunks: Iterable[Iterable[int]],
+          bound: int,
+          output: str = 'list',
+          path: Optional[str] = None) -> Sequence[int]:
+    """Concatenate chunks of primes into the requested output format.
+
+    The chunks are consumed one at a time, so only the packed output (or, for
+    'mmap', nothing but the current chunk) is held in memory.
+
+    Arguments:
+        chunks: Iterable[Iterable[int]]
+            Ascending chunks of primes to concatenate
+        bound: int
+            Upper bound of every prime, used to pick a 32 or 64-bit item type
+        output: str
+            One of 'list', 'array', 'numpy' or 'mmap'
+        path: Optional[str]
+            File to write the primes to when output is 'mmap'
+
+    Returns:
+        Sequence[int]: a list, an array('I') or array('Q'), a numpy uint32 or
+            uint64 array, or a memoryview of the memory-mapped file
+
+    Raises:
+        ImportError: if output is 'numpy' and numpy is not installed
+        ValueError: if output is not a supported format or output is 'mmap'
+            and no path is given
+    """
+    typecode = 'I' if bound <= 1 << 32 else 'Q'
+    if output == 'list':
+        return list(chain.from_iterable(chunks))
+    if output == 'array':
+        packed = array(typecode)
+        for chunk in chunks:
+            packed.extend(chunk)
+        return packed
+    if output == 'numpy':
+        if 'numpy' not in modules:
+            raise ImportError('numpy is required for output \'numpy\'')
+        dtype = numpy.uint32 if typecode == 'I' else numpy.uint64
+        return numpy.concatenate(
+            [numpy.empty(0, dtype)] +
+            [numpy.fromiter(chunk, dtype) for chunk in chunks])
+    if output == 'mmap':
+        if path is None:
+            raise ValueError('a path is required for output \'mmap\'')
+        with open(path, 'wb') as f:
+            for chunk in chunks:
+                array(typecode, chunk).tofile(f)
+        with open(path, 'rb') as f:
+            if fstat(f.fileno()).st_size == 0:
+                return memoryview(b'').cast(typecode)
+            return memoryview(
+                mmap(f.fileno(), 0, access=ACCESS_READ)).cast(typecode)
+    raise ValueError('unsupported output format: {}'.format(output))
+
+
+def _prime_chunks(start: int,
+                  stop: Optional[int],
+                  cache: Optional[PrimeCache] = None
+                  ) -> Iterator[Iterator[int]]:
+    """Yield the primes p with start <= p < stop one sieve window at a time.
+
+    Arguments:
+        start: int
+            Minimum number for the prime search (inclusive)
+        stop: Optional[int]
+            Maximum number for the prime search (exclusive) or None to sieve
+            indefinitely
+        cache: Optional[PrimeCache]
+            Cache to read the windows from instead of sieving them, only used
+            if stop is not None
+
+    Returns:
+        Iterator[Iterator[int]]: an iterator over the primes of each window
+    """
+    if stop is not None and stop <= start:
+        return
+    if start <= 2 and (stop is None or stop > 2):
+        yield iter([2])
+    lo = max(start, 3) | 1
+    if stop is not None and stop <= MILLER_RABIN_LIMIT and \
+            (stop - lo) // 2 * MILLER_RABIN_RATIO < isqrt(max(stop, 0)):
+        yield filter(is_prime, range(lo, stop, 2))
+        return
+    if cache is not None and stop is not None:
+        flags = cache.flags(stop)
+        for i in range(lo // 2, len(flags), SEGMENT_SIZE):
+            yield _unpack(flags[i:i + SEGMENT_SIZE], 2 * i + 1)
+        return
+    base_limit = 0
+    base_primes = []
+    while stop is None or lo < stop:
+        hi = lo + 2 * SEGMENT_SIZE
+        if stop is not None:
+            hi = min(hi, stop)
+        root = isqrt(hi - 1) + 1
+        if root > base_limit:
+            base_limit = max(root, 2 * base_limit)
+            base_primes = list(_unpack(_odd_sieve(base_limit), 1))
+        yield _unpack(_sieve_segment(lo, hi, base_primes), lo)
+        lo = hi
+
+
+def get_primes(n: int,
+               output: str = 'list',
+               path: Optional[str] = None,
+               cache: Optional[PrimeCache] = None) -> Sequence[int]:
     """Return a list of all prime numbers less than n.
     
-    This function determines if each integer is prime with efficiency
-    O(sqrt(n)).  Memory consumption for each prime is O(1).
+    This function uses an odd-only Sieve of Eratosthenes with efficiency
+    O(n log log n).  The sieve is run in windows of SEGMENT_SIZE odd integers
+    so that the working set stays cache sized and only the base primes up to
+    sqrt(n) are held in memory besides the output.
+
+    A list costs several machine words per prime, so for large n the primes
+    can instead be returned packed as 32 or 64-bit integers in an array, a
+    numpy array or a memory-mapped file.  If a PrimeCache is given the sieve
+    is read from it and the cache is extended when it does not reach n.
     
     Arguments:
         n: int
             Maximum number for the prime search
+        output: str
+            'list' (default), 'array', 'numpy' or 'mmap'
+        path: Optional[str]
+            File to write the primes to when output is 'mmap'
+        cache: Optional[PrimeCache]
+            Persistent sieve to read from instead of sieving
+
+    Returns:
+        Sequence[int]: list of prime numbers, or the packed equivalent
+            described by output
+    """
+    return _pack(_prime_chunks(2, n, cache), n, output, path)
+
+
+def iter_primes(start: int = 2, stop: Optional[int] = None) -> Iterator[int]:
+    """Lazily yield the prime numbers p with start <= p < stop.
+
+    The primes are produced by a segmented sieve one window of SEGMENT_SIZE odd
+    integers at a time, beginning at start rather than at 2, so memory use is
+    bounded by one window plus the base primes up to sqrt of the current
+    window.  If stop is None the generator is unbounded, e.g. the first k
+    primes are islice(iter_primes(), k).  A range that is narrow compared to
+    sqrt(stop) is tested with is_prime instead, since sieving it would mean
+    sieving all base primes up to sqrt(stop) first, provided stop is at most
+    MILLER_RABIN_LIMIT so that the test is deterministic.
+
+    Arguments:
+        start: int
+            Minimum number for the prime search (inclusive)
+        stop: Optional[int]
+            Maximum number for the prime search (exclusive) or None to yield
+            primes indefinitely
+
+    Returns:
+        Iterator[int]: the prime numbers in [start, stop) in ascending order
+    """
+    return chain.from_iterable(_prime_chunks(start, stop))
+
+
+def is_prime(n: int) -> bool:
+    """Return True if n is prime.
+
+    After trial division by the primes below 50, this function runs the
+    Miller-Rabin test with the prime bases 2 through 41, which is
+    deterministic for every n < MILLER_RABIN_LIMIT, about 3.3 * 10^24, and so
+    for every 64-bit integer.  Above that the result is probabilistic: a
+    prime is always reported as prime, but a composite that is a strong
+    pseudoprime to all thirteen bases would be too.  Each query costs O(log^3 n) regardless of how large n is, unlike sieving
+    up to n.
+
+    Arguments:
+        n: int
+            Integer to test
 
     Returns:
-        List[int]: list of prime numbers
+        bool: True if n is prime, otherwise False
     """
-    prime_list = []
-    for i in range(2, n):
-        is_prime = True
-        for j in range(2, round(i ** (1 / 2)) + 1):
-            if i % j == 0:
-                is_prime = False
-        if is_prime:
-            prime_list.append(i)
-    return prime_list
+    if n < 2:
+        return False
+    for p in MILLER_RABIN_BASES + (43, 47):
+        if n % p == 0:
+            return n == p
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in MILLER_RABIN_BASES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def is_prime_batch(values: Iterable[int],
+                   processes: Optional[int] = 1) -> List[bool]:
+    """Return whether each integer in values is prime, see is_prime.
+
+    Arguments:
+        values: Iterable[int]
+            Integers to test
+        processes: Optional[int]
+            Number of worker processes to test with, or None to use one per
+            CPU
+
+    Returns:
+        List[bool]: True for each value that is prime, otherwise False
+    """
+    if processes is None:
+        processes = cpu_count()
+    if processes <= 1:
+        return list(map(is_prime, values))
+    values = list(values)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(
+            is_prime, values,
+            chunksize=max(len(values) // (4 * processes), 1)))
+
+
+def _window(sieve: bytearray, offset: int, count: int) -> bytes:
+    """Return count flags of an odd-only sieve starting at index offset, where
+    indices falling outside of the sieve are reported as not prime.
+
+    Arguments:
+        sieve: bytearray
+            Odd-only primality flags
+        offset: int
+            Index of the first flag to return, may be negative
+        count: int
+            Number of flags to return
+
+    Returns:
+        bytes: the requested flags
+    """
+    head = bytes(min(max(-offset, 0), count))
+    body = sieve[max(offset, 0):max(offset + count, 0)]
+    return head + body + bytes(count - len(head) - len(body))
+
+
+def _sequential_segment(addends: List[int],
+                        lo: int,
+                        hi: int,
+                        base_primes: List[int],
+                        flags: Optional[memoryview] = None) -> List[int]:
+    """Return the odd primes p in [lo, hi) for which p + a is prime for every
+    a in addends, all of which must be even.
+
+    The window [lo, hi) is sieved, or read from cached flags, together with
+    the overlap needed to cover every p + a.  Each window of flags is then read
+    as one big integer so the test across all candidates for a single addend
+    is one bitwise AND.
+
+    Arguments:
+        addends: List[int]
+            Even integers that when added to a prime must yield a prime
+        lo: int
+            Odd lower bound (inclusive) of the candidate window
+        hi: int
+            Upper bound (exclusive) of the candidate window
+        base_primes: List[int]
+            Odd primes up to at least sqrt(hi + max(addends))
+        flags: Optional[memoryview]
+            Odd-only primality flags from a PrimeCache covering
+            hi + max(addends), used instead of sieving
+
+    Returns:
+        List[int]: the matching primes in ascending order
+    """
+    count = (hi - lo + 1) // 2
+    if count <= 0:
+        return []
+    seg_lo = max(lo + min(min(addends), 0), 1) | 1
+    seg_hi = hi + max(max(addends), 0)
+    if flags is None:
+        segment = _sieve_segment(seg_lo, seg_hi, base_primes)
+    else:
+        segment = flags[seg_lo // 2:(seg_hi + 1) // 2]
+    shift = (lo - seg_lo) // 2
+    match = int.from_bytes(_window(segment, shift, count), 'big')
+    for a in set(addends):
+        if not match:
+            break
+        match &= int.from_bytes(_window(segment, shift + a // 2, count), 'big')
+    return list(_unpack(match.to_bytes(count, 'big'), lo))
+
+
+def _sequential_chunk(addends: List[int],
+                      lo: int,
+                      hi: int,
+                      limit: int,
+                      cache_path: Optional[str] = None) -> List[int]:
+    """Return the odd primes p in [lo, hi) for which p + a is prime for every
+    a in addends, all of which must be even.
+
+    The chunk is processed one SEGMENT_SIZE window at a time and needs nothing
+    from the caller but its bounds, so chunks can be scanned in separate
+    processes.
+
+    Arguments:
+        addends: List[int]
+            Even integers that when added to a prime must yield a prime
+        lo: int
+            Odd lower bound (inclusive) of the chunk
+        hi: int
+            Upper bound (exclusive) of the chunk
+        limit: int
+            Upper bound (exclusive) of every p + a in the whole search
+        cache_path: Optional[str]
+            Path of a PrimeCache to read the flags from instead of sieving
+
+    Returns:
+        List[int]: the matching primes in ascending order
+    """
+    if cache_path is None:
+        flags = None
+        base_primes = list(_unpack(_odd_sieve(isqrt(max(limit, 1)) + 1), 1))
+    else:
+        flags = PrimeCache(cache_path).flags(limit)
+        base_primes = []
+    matches = []
+    for seg_lo in range(lo, hi, 2 * SEGMENT_SIZE):
+        seg_hi = min(seg_lo + 2 * SEGMENT_SIZE, hi)
+        matches.extend(_sequential_segment(
+            addends, seg_lo, seg_hi, base_primes, flags))
+    return matches
+
+
+def _sequential_chunks(addends: List[int],
+                       stop: int,
+                       limit: int,
+                       processes: Optional[int],
+                       cache: Optional[PrimeCache] = None
+                       ) -> Iterator[List[int]]:
+    """Yield the odd primes p < stop for which p + a is prime for every a in
+    addends, in ascending chunks, scanning in a process pool if requested.
+
+    Arguments:
+        addends: List[int]
+            Even integers that when added to a prime must yield a prime
+        stop: int
+            Upper bound (exclusive) of the candidates
+        limit: int
+            Upper bound (exclusive) of every p + a
+        processes: Optional[int]
+            Number of worker processes, or None to use one per CPU
+        cache: Optional[PrimeCache]
+            Persistent sieve to read from instead of sieving
 
+    Returns:
+        Iterator[List[int]]: the matching primes of each chunk
+    """
+    cache_path = None
+    if cache is not None:
+        cache.flags(limit)
+        cache_path = cache.path
+    if processes is None:
+        processes = cpu_count()
+    if processes <= 1 or stop <= 2 * SEGMENT_SIZE:
+        yield _sequential_chunk(addends, 3, stop, limit, cache_path)
+        return
+    chunk = max(2 * SEGMENT_SIZE, stop // (4 * processes) // 2 * 2)
+    bounds = [(lo, min(lo + chunk, stop)) for lo in range(3, stop, chunk)]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        yield from executor.map(_sequential_chunk,
+                                repeat(addends),
+                                [lo for lo, _ in bounds],
+                                [hi for _, hi in bounds],
+                                repeat(limit),
+                                repeat(cache_path))
 
-def get_sequential_primes(addends: List[int], n: int ) -> List[int]:
+
+def get_sequential_primes(addends: List[int],
+                          n: int,
+                          processes: Optional[int] = 1,
+                          output: str = 'list',
+                          path: Optional[str] = None,
+                          cache: Optional[PrimeCache] = None
+                          ) -> Sequence[int]:
     """Return a list of all prime numbers less than n for which the sum of the
     prime and any number in addends is also prime.
+
+    The odd candidates are scanned with a segmented sieve, so primality of
+    every p + a is an O(1) lookup and all candidates in a window are checked
+    against one addend at a time with a single bitwise operation.  Because
+    p + a is even for odd p and odd a, only the prime 2 and the primes 2 - a
+    for negative odd a need to be checked individually, which is done with
+    is_prime rather than a sieve.
+
+    If processes is greater than 1 the candidates are split into chunks that
+    are sieved, overlap included, and scanned in a process pool.  The chunks
+    are collected in order so the result is identical to the serial search.
+    If a PrimeCache is given every window is read from it instead of sieved.
     
     Arguments:
-        subsequent_primes: List[int]
+        addends: List[int]
             List of integers that when added to a prime number must yield a sum
             which is also prime
         n: int
             Maximum number for the prime search
+        processes: Optional[int]
+            Number of worker processes to scan with, or None to use one per
+            CPU
+        output: str
+            'list' (default), 'array', 'numpy' or 'mmap', see get_primes
+        path: Optional[str]
+            File to write the primes to when output is 'mmap'
+        cache: Optional[PrimeCache]
+            Persistent sieve to read from instead of sieving
+
+    Returns:
+        Sequence[int]: list of prime numbers that when added to each integer
+            in addends yields a prime number, or the packed equivalent
+            described by output
+    """
+    limit = n + max(addends)
+    stop = min(n, limit)
+    odd_addends = [a for a in addends if a % 2]
+    candidates = [2] + [2 - a for a in odd_addends if a < 0]
+    final_primes = [
+        p for p in sorted(set(candidates))
+        if p < stop and is_prime(p)
+        and all(p + a < limit and is_prime(p + a) for a in addends)]
+    if odd_addends:
+        return _pack([final_primes], stop, output, path)
+    chunks = _sequential_chunks(addends, stop, limit, processes, cache)
+    return _pack(chain([final_primes], chunks), stop, output, path)
+
+
+def _mersenne_mod(x: int, p: int) -> int:
+    """Reduce a non-negative integer x modulo the Mersenne number 2^p - 1.
+
+    Because 2^p = 1 mod 2^p - 1, the high bits of x can be folded onto the low
+    bits with a shift and an add instead of a long division.
+
+    Arguments:
+        x: int
+            Non-negative integer to reduce
+        p: int
+            Exponent of the Mersenne modulus
+
+    Returns:
+        int: x mod 2^p - 1
+    """
+    mersenne = (1 << p) - 1
+    while x > mersenne:
+        x = (x & mersenne) + (x >> p)
+    return 0 if x == mersenne else x
+
+
+def lucas_lehmer(p: int) -> bool:
+    """Return True if the Mersenne number 2^p - 1 is prime.
+
+    The Lucas-Lehmer sequence s_0 = 4, s_k = s_(k-1)^2 - 2 is computed modulo
+    2^p - 1 so that s never grows beyond p bits, which makes each of the p - 2
+    steps a single p-bit squaring followed by a shift-and-add reduction.  The
+    test only holds for odd prime p, so 2^2 - 1 = 3 is handled separately.
+
+    Arguments:
+        p: int
+            Exponent of the Mersenne number to test
 
     Returns:
-        List[int]: list of prime numbers that when added to each integer in
-            subsequent_primes yields a prime number
+        bool: True if 2^p - 1 is prime, otherwise False
     """
-    initial_primes = get_primes(n + max(addends))
-    final_primes = []
-    for i in initial_primes:
-        match = True
-        for j in addends:
-            if i + j not in initial_primes:
-                match = False
-        if match:
-            final_primes.append(i)
-    return final_primes
+    if p == 2:
+        return True
+    if p < 2 or not is_prime(p):
+        return False
+    mersenne = (1 << p) - 1
+    s = 4
+    for _ in range(p - 2):
+        s = _mersenne_mod(s * s + mersenne - 2, p)
+    return s == 0
+
+
+def _timed_lucas_lehmer(p: int) -> Tuple[int, bool, float]:
+    """Run lucas_lehmer(p) and return (p, result, wall time in seconds)."""
+    start = perf_counter()
+    result = lucas_lehmer(p)
+    return p, result, perf_counter() - start
+
+
+def lucas_lehmer_batch(exponents: Iterable[int],
+                       processes: Optional[int] = None
+                       ) -> Iterator[Tuple[int, bool, float]]:
+    """Run the Lucas-Lehmer test on many exponents in a process pool and yield
+    each result as soon as it finishes.
+
+    The cost of a test grows faster than p^2, so the exponents are submitted
+    largest first; the long runs start immediately and the short ones fill the
+    remaining workers toward the end of the sweep.  If the iterator is closed
+    early, or the sweep is interrupted, the tests not yet started are
+    cancelled and the call returns without waiting for the running ones.
+
+    Arguments:
+        exponents: Iterable[int]
+            Exponents p of the Mersenne numbers 2^p - 1 to test
+        processes: Optional[int]
+            Number of worker processes, or None to use one per CPU
+
+    Returns:
+        Iterator[Tuple[int, bool, float]]: tuples of the exponent, whether
+            2^p - 1 is prime, and the wall time of the test in seconds, in
+            order of completion
+    """
+    executor = ProcessPoolExecutor(max_workers=processes)
+    try:
+        futures = [executor.submit(_timed_lucas_lehmer, p)
+                   for p in sorted(set(exponents), reverse=True)]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def get_mersenne_primes(n: int) -> List[int]:
     """Return a list of all Mersenne primes less than n.  This function uses the
-    Lucas-Lehmer primality test to determine if a number is prime.  Because the
-    Lucas-Lehmer test only works for Mersenne numbers with odd primes, the value
-    3 is hardcoded
+    Lucas-Lehmer primality test to determine if a number is prime.  Since
+    2^p - 1 can only be prime if p is prime, the candidate exponents are taken
+    from a sieve before any Lucas-Lehmer test is run.
 
     Arguments:
         n: int
-            Maximum number for the Mercen prime search
+            Maximum number for the Mersenne prime search
 
     Returns:
-        List[int]: list of Mercen primes less than n
+        List[int]: list of Mersenne primes less than n
     """
-    primes = [3] if n > 3 else []
-    m = 1
-    last_s = 4
-    max_m = log2(n - 1)
-    while m < max_m:
-        m += 1
-        candidate = (2 ** m) - 1
-        if last_s % candidate == 0:
+    primes = []
+    for p in iter_primes(2, max(n, 2).bit_length() + 1):
+        candidate = (1 << p) - 1
+        if candidate < n and lucas_lehmer(p):
             primes.append(candidate)
-        last_s = (last_s ** 2) - 2
     return primes
 
 
-def penguin_order(n: int) -> List[int]:
+def _greatest_proper_divisors(n: int,
+                              cache: Optional[PrimeCache] = None
+                              ) -> List[int]:
+    """Return a list d where d[i] is the greatest proper divisor of i for
+    1 < i <= n (d[0] and d[1] are 0 and 1 respectively).
+
+    The greatest proper divisor of i is i // p where p is the smallest prime
+    factor of i.  The multiples of each prime p from p^2 upwards have
+    quotients p, p + 1, p + 2, ..., so they are filled in with one slice
+    assignment per prime, largest prime first so that the smallest prime
+    factor is the one left standing.
+
+    Arguments:
+        n: int
+            Largest integer for which to find the greatest proper divisor
+        cache: Optional[PrimeCache]
+            Persistent sieve to take the primes up to sqrt(n) from
+
+    Returns:
+        List[int]: the greatest proper divisor of each integer up to n
+    """
+    divisors = [1] * (n + 1)
+    divisors[0] = 0
+    for p in reversed(get_primes(isqrt(n) + 1, cache=cache)):
+        count = len(range(p * p, n + 1, p))
+        divisors[p * p::p] = range(p, p + count)
+    return divisors
+
+
+def penguin_order(n: int, cache: Optional[PrimeCache] = None) -> List[int]:
     """Get the order of penguins in the queue when each gets in line at the
     greatest m < n that divides n where n is an individual penguin's ticket
     number.
+
+    Each penguin stands directly behind its greatest proper divisor, ahead of
+    any penguin with a lower ticket that joined behind the same divisor, so
+    the queue is a pre-order traversal of the divisor tree rooted at 1 that
+    visits children in descending order.  The tree is built from a smallest
+    prime factor sieve and traversed with an explicit stack.
     
     Argument:
         n: int
             Number of penguins lining up in the queue
+        cache: Optional[PrimeCache]
+            Persistent sieve to take the primes of the divisor sieve from
 
     Returns:
         List[int]: list of integers representing the order of penguins in the
             queue, where each integer corresponds to that penguins ticket number
     """
+    if n < 1:
+        return []
+    parents = _greatest_proper_divisors(n, cache)
+    children = sorted(range(2, n + 1), key=parents.__getitem__)
+    offsets = [0] * (n + 2)
+    for parent, count in Counter(parents[2:]).items():
+        offsets[parent + 1] = count
+    offsets = list(accumulate(offsets))
     queue = []
-    for i in range(1, n + 1):
-        if len(queue) == 0:
-            queue.append(i)
-            continue
-        temp_queue = queue.copy()
-        while len(temp_queue) > 0:
-            if i % max(temp_queue) == 0:
-                queue.insert(queue.index(max(temp_queue)) + 1, i)
-                break
-            else:
-                temp_queue.pop(temp_queue.index(max(temp_queue)))
+    stack = [1]
+    while stack:
+        penguin = stack.pop()
+        queue.append(penguin)
+        stack.extend(children[offsets[penguin]:offsets[penguin + 1]])
     return queue
 
 
@@ -1,10 +1,305 @@
 #!/usr/bin/env python
 
 
-from itertools import combinations, combinations_with_replacement
-from random import uniform
-from statistics import mean
-from typing import List, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fractions import Fraction
+from itertools import repeat
+from math import gcd, isqrt, nan, sqrt
+from multiprocessing import Value
+from multiprocessing.sharedctypes import Synchronized
+from os import cpu_count
+from random import Random
+from statistics import NormalDist
+from sys import modules
+from typing import (Any, Callable, Dict, Iterator, List, Optional, Tuple,
+                    Union)
+
+from prime_numbers import is_prime
+
+
+try:
+    import numpy
+except:
+    pass
+
+
+# Best maximum postage shared between the worker processes of stamp_values.
+_shared_best = None
+
+# Minimum number of iterations before simulate_until stops at its tolerance
+# and checks its estimate against the exact value.
+MIN_CHECKED_ITERATIONS = 1000
+
+
+def _square_residues(modulus: int) -> List[int]:
+    """Return the sorted residues of the perfect squares modulo modulus.
+
+    Arguments:
+        modulus: int
+            The modulus
+
+    Returns:
+        List[int]: every x * x % modulus
+    """
+    return sorted(set(x * x % modulus for x in range(modulus // 2 + 1)))
+
+
+def _pattern_chunk(digits: int,
+                   high: Callable[[int], int],
+                   residues2: List[int],
+                   residues5: List[int]) -> List[int]:
+    """Return the perfect squares of the given number of digits whose high
+    half is high(low half) and whose low half is congruent to a square modulo
+    2^k in residues2 and modulo 5^k in residues5, k being the number of digits
+    of the low half.
+
+    Arguments:
+        digits: int
+            Number of base 10 digits of the squares
+        high: Callable[[int], int]
+            Function returning the required high half given the low half
+        residues2: List[int]
+            Residues of the squares modulo 2^k to combine
+        residues5: List[int]
+            Residues of the squares modulo 5^k to combine
+
+    Returns:
+        List[int]: the matching perfect squares in ascending order
+    """
+    k = digits // 2
+    scale = 10 ** k
+    m2 = 2 ** k
+    m5 = 5 ** k
+    e2 = m5 * pow(m5, -1, m2)
+    e5 = m2 * pow(m2, -1, m5)
+    high_min = 10 ** (digits - k - 1)
+    high_max = 10 ** (digits - k)
+    matches = []
+    for r5 in residues5:
+        for r2 in residues2:
+            low = (r2 * e2 + r5 * e5) % scale
+            h = high(low)
+            if high_min <= h < high_max:
+                n = h * scale + low
+                if isqrt(n) ** 2 == n:
+                    matches.append(n)
+    return sorted(matches)
+
+
+def digit_pattern_squares(digits: int,
+                          high: Callable[[int], int],
+                          processes: Optional[int] = 1,
+                          chunk_size: int = 1024) -> Iterator[int]:
+    """Find every perfect square of the given number of digits whose most
+    significant digits, taken as a number, equal high() of its digits//2
+    least significant digits taken as a number.
+
+    Rather than squaring every root, this function enumerates the low halves,
+    and since the low half of a square is itself a square modulo 10^k, only
+    the residues of the squares modulo 2^k and 5^k, combined by the Chinese
+    remainder theorem, are tried.  That skips roughly 14 in 15 low halves.
+    The residues modulo 5^k are split into chunks which are searched in a
+    process pool if processes is greater than 1, in which case high must be
+    a module-level function so that it can be sent to the workers.  The cost
+    still grows as 10^(digits / 2), so for a linear relation between the
+    halves linear_digit_pattern_squares is far faster.
+
+    Arguments:
+        digits: int
+            Number of base 10 digits of the squares
+        high: Callable[[int], int]
+            Function returning the required high half given the low half
+        processes: Optional[int]
+            Number of worker processes, or None to use one per CPU
+        chunk_size: int
+            Number of residues modulo 5^k searched per task
+
+    Returns:
+        Iterator[int]: the matching perfect squares, ascending within each
+            chunk
+    """
+    k = digits // 2
+    residues2 = _square_residues(2 ** k)
+    residues5 = _square_residues(5 ** k)
+    chunks = [residues5[i:i + chunk_size]
+              for i in range(0, len(residues5), chunk_size)]
+    if processes is None:
+        processes = cpu_count()
+    if processes <= 1:
+        for chunk in chunks:
+            yield from _pattern_chunk(digits, high, residues2, chunk)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for matches in executor.map(_pattern_chunk, repeat(digits),
+                                    repeat(high), repeat(residues2), chunks):
+            yield from matches
+
+
+def _factorize(n: int) -> Dict[int, int]:
+    """Factorize a positive integer by trial division and Pollard's rho.
+
+    Arguments:
+        n: int
+            The integer to factorize
+
+    Returns:
+        Dict[int, int]: the prime factors of n and their multiplicities
+    """
+    factors = {}
+    for p in range(2, 1000):
+        while n % p == 0:
+            factors[p] = factors.get(p, 0) + 1
+            n //= p
+    stack = [n] if n > 1 else []
+    while stack:
+        m = stack.pop()
+        if is_prime(m):
+            factors[m] = factors.get(m, 0) + 1
+            continue
+        c = 1
+        while True:
+            x = y = 2
+            d = 1
+            while d == 1:
+                x = (x * x + c) % m
+                y = (y * y + c) % m
+                y = (y * y + c) % m
+                d = gcd(x - y, m)
+            if d != m:
+                break
+            c += 1
+        stack.extend([d, m // d])
+    return factors
+
+
+def _sqrt_mod_prime(u: int, p: int) -> Optional[int]:
+    """Return a square root of u modulo an odd prime p by the Tonelli-Shanks
+    algorithm, or None if u is not a quadratic residue.
+
+    Arguments:
+        u: int
+            Integer not divisible by p
+        p: int
+            Odd prime modulus
+
+    Returns:
+        Optional[int]: x such that x * x % p == u % p, or None
+    """
+    u %= p
+    if pow(u, (p - 1) // 2, p) != 1:
+        return None
+    if p % 4 == 3:
+        return pow(u, (p + 1) // 4, p)
+    q = p - 1
+    s = 0
+    while q % 2 == 0:
+        q //= 2
+        s += 1
+    z = 2
+    while pow(z, (p - 1) // 2, p) != p - 1:
+        z += 1
+    m, c, t, r = s, pow(z, q, p), pow(u, q, p), pow(u, (q + 1) // 2, p)
+    while t != 1:
+        i = 1
+        t2 = t * t % p
+        while t2 != 1:
+            t2 = t2 * t2 % p
+            i += 1
+        b = pow(c, 1 << (m - i - 1), p)
+        m, c, t, r = i, b * b % p, t * b * b % p, r * b % p
+    return r
+
+
+def _sqrt_mod_prime_power(c: int, p: int, e: int) -> List[int]:
+    """Return every square root of c modulo p^e.
+
+    For odd p a root modulo p is found by Tonelli-Shanks and lifted to p^e by
+    Hensel's lemma, after factoring out the even power of p dividing c.  The
+    prime 2 only divides the modulus for one-digit squares, so it is searched
+    exhaustively.
+
+    Arguments:
+        c: int
+            The integer whose square roots to find
+        p: int
+            Prime
+        e: int
+            Exponent of the prime power modulus
+
+    Returns:
+        List[int]: every x in [0, p^e) such that x * x % p^e == c % p^e
+    """
+    q = p ** e
+    c %= q
+    if p == 2:
+        return [x for x in range(q) if x * x % q == c]
+    if c == 0:
+        return list(range(0, q, p ** ((e + 1) // 2)))
+    t = 0
+    while c % p == 0:
+        c //= p
+        t += 1
+    if t % 2 == 1:
+        return []
+    f = e - t
+    r = _sqrt_mod_prime(c, p)
+    if r is None:
+        return []
+    pf = p
+    for _ in range(f - 1):
+        pf *= p
+        r = (r - (r * r - c) * pow(2 * r, -1, pf)) % pf
+    shift = p ** (t // 2)
+    return sorted(set((shift * (y + pf * z)) % q
+                      for y in (r, pf - r) for z in range(shift)))
+
+
+def linear_digit_pattern_squares(digits: int,
+                                 multiplier: int = 1,
+                                 offset: int = -1) -> Iterator[int]:
+    """Find every perfect square of the given number of digits whose most
+    significant digits, taken as a number, equal multiplier times its
+    digits//2 least significant digits taken as a number, plus offset.
+
+    With k = digits // 2 and M = multiplier * 10^k + 1, such a square x^2
+    satisfies x^2 = low * M + offset * 10^k, so x must be a square root of
+    offset * 10^k modulo M.  Those roots are found by factoring M and
+    combining the roots modulo each prime power with the Chinese remainder
+    theorem, after which only the few x in range congruent to a root are
+    checked, so 30 digit squares take milliseconds.
+
+    Arguments:
+        digits: int
+            Number of base 10 digits of the squares
+        multiplier: int
+            Positive factor relating the low half to the high half
+        offset: int
+            Offset relating the low half to the high half
+
+    Returns:
+        Iterator[int]: the matching perfect squares in ascending order
+    """
+    k = digits // 2
+    scale = 10 ** k
+    modulus = multiplier * scale + 1
+    target = offset * scale
+    roots = [0]
+    combined = 1
+    for p, e in _factorize(modulus).items():
+        q = p ** e
+        inverse = pow(combined, -1, q)
+        roots = [r + combined * ((s - r) * inverse % q)
+                 for r in roots for s in _sqrt_mod_prime_power(target, p, e)]
+        combined *= q
+    lo = isqrt(10 ** (digits - 1) - 1) + 1
+    hi = isqrt(10 ** digits - 1)
+    squares = []
+    for r in roots:
+        for x in range(lo + (r - lo) % modulus, hi + 1, modulus):
+            n = x * x
+            if n // scale == multiplier * (n % scale) + offset:
+                squares.append(n)
+    yield from sorted(squares)
 
 
 def six_digit_perfect_square() -> Union[int, None]:
@@ -16,15 +311,166 @@ def six_digit_perfect_square() -> Union[int, None]:
         The perfect square satisfying the above conditions if found, otherwise
         None.
     """
-    for i in range(300, 1000):
-        j = i * i
-        lsd = j % 1000
-        msd = (j - lsd) // 1000
-        if msd == lsd - 1:
-            return j
+    return next(linear_digit_pattern_squares(6, 1, -1), None)
 
 
-def stamp_values(n: int, m: int) -> Tuple[int, List[int]]:
+def _add_stamp(reach: List[int], value: int) -> List[int]:
+    """Add a stamp value to the minimum-stamps-per-value table of a set of
+    stamps.
+
+    The table is stored as one bitmask per number of stamps j, in which bit v
+    is set if postage v can be made with at most j stamps, so that the minimum
+    number of stamps for v is the first j whose bit v is set.  Adding a value
+    d is the recurrence reach'[j] = reach[j] | (reach'[j - 1] << d), i.e. the
+    usual min-stamps dynamic program evaluated for every postage value at once.
+
+    Arguments:
+        reach: List[int]
+            Bitmasks of the postage values reachable with at most 0 to m
+            stamps of the current set
+        value: int
+            Stamp value to add
+
+    Returns:
+        List[int]: the bitmasks of the set with the new stamp value added
+    """
+    extended = [reach[0]]
+    for j in range(1, len(reach)):
+        extended.append(reach[j] | (extended[-1] << value))
+    return extended
+
+
+def _coverage(reach: List[int]) -> int:
+    """Return the largest postage value v such that every value from 1 to v
+    can be posted with the maximum number of stamps.
+
+    Arguments:
+        reach: List[int]
+            Bitmasks of the postage values reachable with at most 0 to m
+            stamps
+
+    Returns:
+        int: the maximum postage value
+    """
+    full = reach[-1]
+    return ((full + 1) & ~full).bit_length() - 2
+
+
+def _stamp_search(n: int,
+                  stamps: List[int],
+                  reach: List[int],
+                  best: List[Any],
+                  shared: Optional[Synchronized] = None) -> None:
+    """Depth-first search over the stamp sets extending stamps, updating best
+    with the highest maximum postage found.
+
+    Sets are built in canonical order, each new stamp value being larger than
+    the last but at most one more than the current maximum postage, since a
+    larger value could never post the next postage value.  A branch is
+    pruned once even the most optimistic growth of the maximum postage,
+    multiplying by m per remaining stamp value, cannot reach the best found.
+    Ties are broken by keeping the lexicographically smallest set, and since
+    only branches that cannot even tie are pruned, the result does not depend
+    on the order in which branches are searched.
+
+    Arguments:
+        n: int
+            The number of unique stamp values in circulation.
+        stamps: List[int]
+            The stamp values chosen so far in ascending order.
+        reach: List[int]
+            The minimum-stamps table of stamps, see _add_stamp.
+        best: List[Any]
+            The best maximum postage and stamp values found so far, updated
+            in place.
+        shared: Optional[Synchronized]
+            The best maximum postage found by any worker process, read for
+            pruning and raised when this search improves on it.
+    """
+    m = len(reach) - 1
+    coverage = _coverage(reach)
+    remaining = n - len(stamps)
+    if remaining == 0:
+        if coverage > best[0] or \
+                (coverage == best[0] and tuple(stamps) < best[1]):
+            best[0], best[1] = coverage, tuple(stamps)
+            if shared is not None and coverage > shared.value:
+                with shared.get_lock():
+                    shared.value = max(shared.value, coverage)
+        return
+    target = best[0] if shared is None else max(best[0], shared.value)
+    bound = coverage
+    for _ in range(remaining):
+        bound = m * (bound + 1)
+    if bound < target:
+        return
+    for value in range(coverage + 1, stamps[-1], -1):
+        if remaining == 1 and m * value < target:
+            break
+        _stamp_search(n, stamps + [value], _add_stamp(reach, value), best,
+                      shared)
+
+
+def _stamp_prefixes(n: int, m: int, count: int) -> List[List[int]]:
+    """Return canonical prefixes of the stamp sets, see _stamp_search, such
+    that every set starts with exactly one of them.
+
+    The prefixes are deepened one stamp value at a time until there are at
+    least count of them or they are one value short of a full set, so that a
+    process pool has enough subtrees to balance its load whatever n and m.
+
+    Arguments:
+        n: int
+            The number of unique stamp values in circulation.
+        m: int
+            The maximum number of stamps allowed to post a letter.
+        count: int
+            The number of prefixes at which to stop deepening.
+
+    Returns:
+        List[List[int]]: the prefixes, in descending lexicographic order so
+            that the larger subtrees come first
+    """
+    prefixes = [([1], [(1 << (j + 1)) - 1 for j in range(m + 1)])]
+    while len(prefixes) < count and len(prefixes[0][0]) < n - 1:
+        prefixes = [(stamps + [value], _add_stamp(reach, value))
+                    for stamps, reach in prefixes
+                    for value in range(stamps[-1] + 1, _coverage(reach) + 2)]
+    return [stamps for stamps, _ in reversed(prefixes)]
+
+
+def _init_stamp_worker(shared: Synchronized) -> None:
+    """Store the best maximum postage shared between worker processes."""
+    global _shared_best
+    _shared_best = shared
+
+
+def _stamp_subtree(n: int, m: int, prefix: List[int]) -> Tuple[int, tuple]:
+    """Search every stamp set starting with prefix in a worker process.
+
+    Arguments:
+        n: int
+            The number of unique stamp values in circulation.
+        m: int
+            The maximum number of stamps allowed to post a letter.
+        prefix: List[int]
+            The smallest stamp values of every set to search.
+
+    Returns:
+        Tuple[int, tuple]: the best maximum postage and stamp values found,
+            or 0 and an empty tuple if every set was pruned
+    """
+    reach = [(1 << (j + 1)) - 1 for j in range(m + 1)]
+    for value in prefix[1:]:
+        reach = _add_stamp(reach, value)
+    best = [0, ()]
+    _stamp_search(n, prefix, reach, best, _shared_best)
+    return best[0], best[1]
+
+
+def stamp_values(n: int,
+                 m: int,
+                 processes: Optional[int] = 1) -> Tuple[int, List[int]]:
     """Find the maximum postage value and the n values of the stamps required to
     reach it given the following constraints:
     1. There are n stamps with unique values
@@ -32,38 +478,52 @@ def stamp_values(n: int, m: int) -> Tuple[int, List[int]]:
     3. The maximum postage value is the maximum value that can be posted with m
     stamps with every lesser integer postage value able to be posted also using
     a maximum of m stamps.
+
+    The candidate stamp sets are searched branch and bound, extending each set
+    one stamp value at a time and growing its range of postage values with the
+    minimum-stamps-per-value dynamic program instead of enumerating every
+    combination of stamps.  If several sets reach the maximum postage value the
+    lexicographically smallest is returned.
+
+    If processes is greater than 1 the sets are partitioned by their smallest
+    stamp values, taking as many as are needed for at least four partitions
+    per process, and the partitions are searched in a process pool, with the
+    best maximum postage found so far shared between the workers for pruning.  The result is identical to the serial search.
     
     Arguments:
         n: int
             The number of unique stamp values in circulation.
         m: int
             The maximum number of stamps allowed to post a letter.
+        processes: Optional[int]
+            Number of worker processes to search with, or None to use one per
+            CPU.
 
     Returns:
         Tuple[int, List[int]: The first index of the tuple is the maximum
             postage value.  The second index is a list of the stamps required to
             attain that value.
     """
-    max_value = n
-    last_match = []
-    while True:
-        current_match = None
-        combos = combinations([i for i in range(1, max_value + 1)], n)
-        for stamp_values in combos:
-            sums = [0] * (max_value + 1)
-            for i in range(m + 1):
-                for c in combinations_with_replacement(stamp_values, i):
-                    if sum(c) < len(sums):
-                        sums[sum(c)] += 1
-            try:
-                sums[1:].index(0)
-            except ValueError as e:
-                current_match = stamp_values
-                break
-        if not current_match:
-            return max_value - 1, last_match
-        last_match = current_match
-        max_value += 1
+    if processes is None:
+        processes = cpu_count()
+    if processes <= 1 or n <= 2:
+        reach = [(1 << (j + 1)) - 1 for j in range(m + 1)]
+        best = [0, ()]
+        _stamp_search(n, [1], reach, best)
+        return best[0], best[1]
+    shared = Value('l', 0)
+    best = (0, ())
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=_init_stamp_worker,
+                             initargs=(shared,)) as executor:
+        futures = [executor.submit(_stamp_subtree, n, m, prefix)
+                   for prefix in _stamp_prefixes(n, m, 4 * processes)]
+        for future in as_completed(futures):
+            coverage, stamps = future.result()
+            if coverage > best[0] or \
+                    (coverage == best[0] and stamps < best[1]):
+                best = (coverage, stamps)
+    return best
 
 
 def shortest_name(names: List[str]) -> Union[str, None]:
@@ -72,6 +532,12 @@ def shortest_name(names: List[str]) -> Union[str, None]:
     ['add', 'dog', 'tree', 'house', 'gave'], 'gave' is the word that satisfies
     the above requirement.
 
+    Each name is reduced once to a bitmask of the characters it contains,
+    ignoring spaces, so that two names share a character exactly when the
+    bitwise AND of their masks is non-zero.  Names with the same mask are
+    tested together, and the names are tested shortest first so that the
+    search stops at the first name that passes.
+
     Arguments:
         names: List[str]
             List of names to search.
@@ -80,53 +546,223 @@ def shortest_name(names: List[str]) -> Union[str, None]:
         Union[str, None]: the shortest name that shares a letter in common with
             every other name or None if no such name exists.
     """
-    return_list = []
-    for current_name in names:
-        candidate = True
-        for compare_name in names:
-            shares_letter = False
-            for letter in current_name.replace(' ', ''):
-                if letter in compare_name.replace(' ', ''):
-                    shares_letter = True
-                    break
-            if shares_letter == False:
-                candidate = False
-                break
-        if candidate != False:
-            return_list.append(current_name)
-    if len(return_list) == 0:
+    bits = {}
+    masks = []
+    for name in names:
+        mask = 0
+        for letter in set(name):
+            if letter != ' ':
+                mask |= 1 << bits.setdefault(letter, len(bits))
+        masks.append(mask)
+    distinct = set(masks)
+    if 0 in distinct:
         return None
-    smallest_name = return_list[0]
-    for name in return_list:
-        if len(name) < len(smallest_name):
-            smallest_name = name
-    return smallest_name
+    tested = {}
+    for i in sorted(range(len(names)), key=lambda i: len(names[i])):
+        mask = masks[i]
+        if mask not in tested:
+            tested[mask] = all(mask & other for other in distinct)
+        if tested[mask]:
+            return names[i]
+    return None
+
+
+def simulate_probabilities(n: int,
+                           iterations: int,
+                           seed: Optional[int] = None,
+                           confidence: float = 0.95,
+                           chunk_size: int = 1 << 20
+                           ) -> Iterator[Tuple[int, float, float]]:
+    """Simulate the crater problem described in probabilities in blocks and
+    report the running estimate after each block.
+
+    Each block draws the positions of the n re-supply stations for up to
+    chunk_size / n hikers at once and reduces them with a minimum along the
+    stations, using numpy if it is installed and the random module otherwise,
+    so memory use is bounded by chunk_size whatever the number of iterations.
+
+    Arguments:
+        n: int
+            Number of re-supply stations dropped on the circumference of the
+            crater.
+        iterations: int
+            The number of iterations to run this simulation.
+        seed: Optional[int]
+            Seed of the random number generator, for reproducible results.
+        confidence: float
+            Confidence level of the reported confidence interval.
+        chunk_size: int
+            Maximum number of station positions drawn at once.
+
+    Returns:
+        Iterator[Tuple[int, float, float]]: after each block, the number of
+            iterations simulated so far, the running mean of the distance and
+            the half-width of the confidence interval around it
+    """
+    if 'numpy' in modules:
+        generator = numpy.random.default_rng(seed)
+    else:
+        generator = Random(seed)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rows = max(chunk_size // n, 1)
+    count = 0
+    total = 0.0
+    total_squares = 0.0
+    while count < iterations:
+        size = min(rows, iterations - count)
+        if 'numpy' in modules:
+            distances = generator.random((size, n)).min(axis=1)
+            total += float(distances.sum())
+            total_squares += float(distances @ distances)
+        else:
+            distances = [min(generator.random() for _ in range(n))
+                         for _ in range(size)]
+            total += sum(distances)
+            total_squares += sum(d * d for d in distances)
+        count += size
+        mean = total / count
+        variance = 0.0
+        if count > 1:
+            variance = max(total_squares - count * mean * mean, 0.0) / \
+                (count - 1)
+        yield count, mean, z * sqrt(variance / count)
+
+
+def expected_distance(n: int) -> Fraction:
+    """Return the exact expected distance of the crater problem described in
+    probabilities.
+
+    Setting off from a random point in a random direction, the distance to
+    each of the n re-supply stations is uniform on [0, 1) and independent of
+    the others, so the distance walked is the minimum of n uniforms, whose
+    expectation is 1 / (n + 1).
+
+    Arguments:
+        n: int
+            Number of re-supply stations dropped on the circumference of the
+            crater.
+
+    Returns:
+        Fraction: the expected distance walked as a fraction of the
+            circumference of the crater
+    """
+    return Fraction(1, n + 1)
+
+
+def distance_cdf(n: int, x: float) -> float:
+    """Return the probability that the hiker of the crater problem described
+    in probabilities walks at most x before encountering a re-supply station,
+    that is 1 - (1 - x)^n.
+
+    Arguments:
+        n: int
+            Number of re-supply stations dropped on the circumference of the
+            crater.
+        x: float
+            Distance as a fraction of the circumference of the crater.
+
+    Returns:
+        float: the cumulative distribution function of the distance at x
+    """
+    x = min(max(x, 0.0), 1.0)
+    return 1.0 - (1.0 - x) ** n
+
+
+def simulate_until(n: int,
+                   tolerance: float,
+                   seed: Optional[int] = None,
+                   confidence: float = 0.95,
+                   max_iterations: Optional[int] = None,
+                   chunk_size: int = 1 << 16) -> Tuple[int, float, float]:
+    """Simulate the crater problem described in probabilities until the
+    confidence interval around the estimate is narrower than tolerance on each
+    side, or max_iterations have been simulated.
+
+    Once the tolerance is reached, after at least MIN_CHECKED_ITERATIONS
+    iterations, the estimate is checked against expected_distance and a
+    ValueError is raised if the exact value lies outside four half-widths of
+    it, which with that many samples points at a broken random number
+    generator rather than bad luck.  A run stopped by max_iterations before
+    that is returned unchecked.
+
+    Arguments:
+        n: int
+            Number of re-supply stations dropped on the circumference of the
+            crater.
+        tolerance: float
+            Half-width of the confidence interval at which to stop.
+        seed: Optional[int]
+            Seed of the random number generator, for reproducible results.
+        confidence: float
+            Confidence level of the confidence interval.
+        max_iterations: Optional[int]
+            Maximum number of iterations to simulate, or None for no limit.
+        chunk_size: int
+            Maximum number of station positions drawn at once, which is also
+            how often the stopping condition is checked.
+
+    Returns:
+        Tuple[int, float, float]: the number of iterations simulated, the
+            estimated expected distance and the half-width of the confidence
+            interval around it
+    """
+    if max_iterations is None:
+        max_iterations = 1 << 62
+    count, mean, half_width = 0, nan, nan
+    reached = False
+    for count, mean, half_width in simulate_probabilities(
+            n, max_iterations, seed, confidence, chunk_size):
+        if count >= MIN_CHECKED_ITERATIONS and half_width <= tolerance:
+            reached = True
+            break
+    if reached and half_width > 0 and \
+            abs(mean - expected_distance(n)) > 4 * half_width:
+        raise ValueError('Simulated mean {} disagrees with the exact value {}'
+                         .format(mean, float(expected_distance(n))))
+    return count, mean, half_width
 
 
-def probabilities(n: int, iterations: int) -> float:
+def probabilities(n: int,
+                  iterations: Optional[int] = None,
+                  seed: Optional[int] = None,
+                  tolerance: Optional[float] = None) -> float:
     """Find the expected value of the distance the hiker has to walk around the
     circumference of the crater assuming that n re-supply stations have been
     dropped in random locations and the hiker chooses to set off in a random
     direction at the start of the journey.  Simulate this scenario 'iterations'
     number of times to find the expected value.
 
+    The simulation runs in bounded memory blocks, see simulate_probabilities.
+    If tolerance is given the simulation stops early once the confidence
+    interval is that narrow, see simulate_until, and if neither iterations nor
+    tolerance is given the exact value from expected_distance is returned
+    without simulating at all.
+
     Arguments:
         n: int
             Number of re-supply stations dropped on the circumference of the
             crater.
-        iterations: int
+        iterations: Optional[int]
             The number of iterations to run this simulation.
+        seed: Optional[int]
+            Seed of the random number generator, for reproducible results.
+        tolerance: Optional[float]
+            Half-width of the 95% confidence interval at which to stop.
 
     Returns:
         float: the expected distance the hiker has to walk to encounter the
             first re-supply station as a percentage of the circumference of the
             crater.
     """
-    distances = []
-    for i in range(iterations):
-        stations = [uniform(0,1) for j in range(n)]
-        distances.append(min(stations))
-    return mean(distances)
+    if tolerance is not None:
+        return simulate_until(n, tolerance, seed,
+                              max_iterations=iterations)[1]
+    if iterations is None:
+        return float(expected_distance(n))
+    mean = nan
+    for _, mean, _ in simulate_probabilities(n, iterations, seed):
+        pass
+    return mean
 
 
 if __name__ == '__main__':
@@ -167,4 +803,6 @@ if __name__ == '__main__':
     # counter-clockwise around the equator.  Find the expected value of the
     # distance that the hiker will walk (in terms of the circumference of the
     # crater) before encountering a re-supply station.
-    print('Problem #4:\n{}'.format(probabilities(2, int(1e6))))
\ No newline at end of file
+    count, mean, half_width = simulate_until(2, 1e-3, max_iterations=10**6)
+    print('Problem #4:\n{} (exact)\n{} +/- {} ({} iterations)'.format(
+        expected_distance(2), mean, half_width, count))
\ No newline at end of file
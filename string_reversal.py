@@ -1,34 +1,241 @@
 #!/usr/bin/env python
 
 
-def reversal(s: str) -> str:
+from array import array
+from codecs import getincrementaldecoder
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice, repeat
+from os import cpu_count
+from re import DOTALL, Match, Pattern, compile, escape
+from tempfile import TemporaryFile
+from typing import IO, Iterable, Iterator, List, Optional, Tuple, Union
+from unicodedata import category
+
+
+# Number of Documents kept by document() for reuse.
+DOCUMENT_CACHE_SIZE = 32
+
+# Total length of the text of the Documents kept by document() for reuse.
+DOCUMENT_CACHE_CHARACTERS = 1 << 24
+
+# Least recently used cache of Documents, keyed by their text.
+_documents = OrderedDict()
+
+# Total length of the text of the Documents in _documents.
+_document_characters = 0
+
+# Matches a word.
+_WORD = compile(r'\S+')
+
+# Match the last of a run of '.', '?' and '!' respectively followed by
+# whitespace, unless that is a single whitespace character followed by an
+# ASCII lower case letter.  The punctuation and the first whitespace character
+# end the sentence, if it ends there, and the rest of the whitespace is
+# dropped.  Group 1 spans that rest if the next character is an ASCII
+# character other than a lower case letter, or the text ends, so that the
+# break certainly ends the sentence; otherwise group 1 does not take part in
+# the match.  A separate expression per mark lets each scan skip ahead to its
+# literal first character, which is much faster than scanning for a class.
+_SENTENCE_BREAKS = tuple(
+    compile(escape(mark) + r'\s(?:(\s*)(?![\sa-z\x80-\U0010ffff])|'
+            r'\s*(?:(?<=\s\s)(?=[a-z])|(?=[^\s\x00-\x7f])))')
+    for mark in '.?!')
+
+# Matches the breaks matched by _SENTENCE_BREAKS without group 1, with group 1
+# spanning the whitespace they drop.
+_IRREGULAR_BREAK = compile(r'[.?!]\s(\s*)(?:(?<=\s\s)(?=[a-z])|'
+                           r'(?=[^\s\x00-\x7f]))')
+
+# Matches a sentence break at the end of a chunk whose following character has
+# not been read yet.
+_PENDING_BREAK = compile(r'[.?!]\s*\Z')
+
+
+@lru_cache(maxsize=64)
+def _grapheme(marks: str) -> Pattern:
+    """Compile the regular expression matching one grapheme cluster of a
+    string whose combining marks are marks.
+
+    This approximates the Unicode extended grapheme cluster rules: a CR LF
+    pair, a pair of regional indicators (a flag), or any character followed
+    by combining marks, emoji modifiers, Hangul vowel and final jamo, or a
+    zero width joiner and the character it joins.  Only the combining marks
+    that occur in the string are put in the expression, so that no table of
+    every code point has to be built.
+
+    Arguments:
+        marks : str
+            the distinct combining marks of the string, in order
+
+    Returns:
+        Pattern: the compiled regular expression
+    """
+    return compile(r'\r\n|[\U0001F1E6-\U0001F1FF]{2}|.(?:[' + escape(marks) +
+                   r'\U0001F3FB-\U0001F3FF\u1160-\u11FF]|\u200D.)*', DOTALL)
+
+
+def _segment(p: str) -> Tuple[array, array]:
+    """Find the sentences of a paragraph and the whitespace to drop within
+    them.
+
+    A sentence ends after the first whitespace character following the last
+    of a run of '.', '?' or '!', provided the next printable character is not
+    lower case, or the text ends.  Any further whitespace after such a break
+    is dropped, whether or not it ends the sentence, as is the whitespace
+    after the last sentence beyond its first character.
+
+    The spans of the breaks followed by ASCII are read from the matches of
+    _SENTENCE_BREAKS without a Python step per break.  Only the breaks it
+    leaves unclassified are found again with _IRREGULAR_BREAK, checked with
+    str.upper() and merged back in order.
+
+    Arguments:
+        p : str
+            input paragraph
+
+    Returns:
+        Tuple[array, array]: array('Q') of start and end offsets of the
+            sentences, as returned by sentence_spans, and array('Q') of start
+            and end offsets of the runs of whitespace to drop inside them
+    """
+    spans = array('Q')
+    gaps = array('Q')
+    if len(p) == 0:
+        return spans, gaps
+    breaks = array('q', sorted(chain.from_iterable(
+        chain.from_iterable(map(Match.span, pattern.finditer(p), repeat(1)))
+        for pattern in _SENTENCE_BREAKS)))
+    if -1 in breaks:
+        # Some breaks are followed by a lower case letter after extra
+        # whitespace, or by a character outside ASCII, and are checked here.
+        irregular = []
+        for match in _IRREGULAR_BREAK.finditer(p):
+            start, end = match.span(1)
+            following = p[end]
+            if following.upper() == following:
+                irregular.extend((start, end))
+            elif start < end:
+                gaps.extend((start, end))
+        breaks = sorted(chain(filter((-1).__ne__, breaks), irregular))
+    spans.extend(chain((0,), breaks))
+    if spans[-1] == len(p):
+        spans.pop()
+    else:
+        spans.append(len(p))
+    return spans, gaps
+
+
+def _drop_gaps(p: str, spans: array, gaps: array) -> Tuple[str, array]:
+    """Drop runs of whitespace from a paragraph.
+
+    Arguments:
+        p : str
+            input paragraph
+        spans : array
+            array('Q') of start and end offsets of its sentences
+        gaps : array
+            array('Q') of start and end offsets of the runs to drop, none of
+            which contains an offset in spans
+
+    Returns:
+        Tuple[str, array]: the paragraph without the runs and the offsets in
+            spans moved to match
+    """
+    pieces = []
+    moved = array('Q')
+    position = 0
+    dropped = 0
+    i = 0
+    for offset in spans:
+        while i < len(gaps) and gaps[i] < offset:
+            pieces.append(p[position:gaps[i]])
+            position = gaps[i + 1]
+            dropped += gaps[i + 1] - gaps[i]
+            i += 2
+        moved.append(offset - dropped)
+    while i < len(gaps):
+        pieces.append(p[position:gaps[i]])
+        position = gaps[i + 1]
+        i += 2
+    pieces.append(p[position:])
+    return ''.join(pieces), moved
+
+
+def _reverse_view(view: memoryview, block_size: int = 1 << 16) -> None:
+    """Reverse a writable one-dimensional memoryview in place by swapping
+    blocks of block_size items between its two ends, so that the temporary
+    copies never exceed two blocks whatever the size of the buffer.
+
+    Arguments:
+        view : memoryview
+            buffer to reverse
+        block_size : int
+            number of items to swap at a time
+    """
+    if view.itemsize == 1 and view.c_contiguous:
+        view = view.cast('B')
+    n = len(view)
+    for i in range(0, n // 2, block_size):
+        size = min(block_size, n // 2 - i)
+        head = view[i:i + size].tobytes()
+        tail = view[n - i - size:n - i].tobytes()
+        if view.format == 'B':
+            view[i:i + size] = tail[::-1]
+            view[n - i - size:n - i] = head[::-1]
+        else:
+            fmt = view.format
+            view[i:i + size] = memoryview(tail).cast(fmt)[::-1]
+            view[n - i - size:n - i] = memoryview(head).cast(fmt)[::-1]
+
+
+def reversal(s: Union[str, bytes, bytearray, memoryview]
+             ) -> Union[str, bytes, bytearray, memoryview]:
     """Reverse a string such that s[n] = s[len(s) - 1 -  n]
     for 0 < n < len(s) / 2.
 
-    This function can run in O(n) time.  Although the actual reversal is
-    performed in place, the function returns a new string.
+    This function can run in O(n) time.  A bytearray or writable memoryview is
+    reversed in place within the caller's buffer and returned, using C-level
+    copies and no per-item objects.  Immutable bytes, and read-only
+    memoryviews, are returned as a reversed copy.  A str is reversed by
+    grapheme cluster, so that combining marks, emoji sequences and flags stay
+    attached to the characters they modify; an ASCII str, or one without any
+    such sequences, is reversed with a single slice.
 
     Arguments:
-        s : str
-            input string
+        s : Union[str, bytes, bytearray, memoryview]
+            input string or buffer
 
     Returns:
-        str: the reversed string
+        Union[str, bytes, bytearray, memoryview]: the reversed string, or s
+            itself reversed in place if it is mutable
     """
-    s = list(s)
-    for i in range(int(len(s)/2)):
-        temp = s[i]
-        s[i] = s[len(s) - 1 - i]
-        s[len(s) - 1 - i] = temp
-    return ''.join(s)
+    if isinstance(s, bytearray):
+        s.reverse()
+        return s
+    if isinstance(s, memoryview):
+        if s.readonly:
+            return s[::-1].tobytes()
+        _reverse_view(s)
+        return s
+    if isinstance(s, bytes) or s.isascii():
+        return s[::-1]
+    marks = ''.join(sorted(c for c in set(s)
+                           if category(c) in ('Mn', 'Mc', 'Me')))
+    clusters = _grapheme(marks).findall(s)
+    if len(clusters) == len(s):
+        return s[::-1]
+    return ''.join(clusters[::-1])
 
 
 def sentence_reversal(s: str) -> str:
     """Reverse the order of words in a sentence ignoring punctuation.
 
-    This function can run in O(n) time. Because Python requires returning a new
-    copy of a string and not a pointer this function does not technically
-    perform the operation in place.
+    This function can run in O(n) time.  The words, delimited by any Unicode
+    whitespace, are found in one pass by str.split() and joined once in
+    reverse order, so apart from the words themselves only the output string
+    is allocated.
 
     Arguments:
         s : str
@@ -37,19 +244,16 @@ def sentence_reversal(s: str) -> str:
     Returns:
         str: the sentence with the order of words reversed
     """
-    s = reversal(s).split()
-    for i in range(len(s)):
-        s[i] = reversal(s[i])
-    return ' '.join(s)
+    return ' '.join(s.split()[::-1])
 
 
 def sentence_reversal_with_punctuation(s: str) -> str:
     """Reverse the order of words in a sentence and preserve the sentence's
     punction mark.
 
-    This function can run in O(n) time.  Because Python requires returning a
-    new copy of a string and not a pointer, this function does not technically
-    perform the operation in place.
+    This function can run in O(n) time.  The punctuation mark is split off,
+    the first letter of the sentence lowered in its word, and the words are
+    joined once in reverse order before the new first letter is capitalized.
 
     Arguments:
         s : str
@@ -59,28 +263,233 @@ def sentence_reversal_with_punctuation(s: str) -> str:
         str: the sentence with the word order reversed and punctuation
             preserved
     """
-    s = list(s)
-    s[0] = s[0].lower()
-    valid_punctuation = ['.', '?', '!']
-    mark = ''
-    if s[-1] in valid_punctuation:
-        mark = s[-1]
-        s = s[:-1]
-    s = reversal(''.join(s)).split()
-    for i in range(len(s)):
-        s[i] = reversal(s[i])
-    s = ' '.join(s) + mark
-    s = list(s)
-    s[0] = s[0].upper()
-    return ''.join(s)
+    mark = s[-1:] if s[-1:] in ('.', '?', '!') else ''
+    words = s[:len(s) - len(mark)].split()
+    if len(words) == 0:
+        return mark
+    if not s[0].isspace():
+        words[0] = words[0][0].lower() + words[0][1:]
+    s = ' '.join(words[::-1]) + mark
+    return s[0].upper() + s[1:]
+
+
+def _reverse_sentences(sentences: List[str],
+                       punctuation: bool) -> List[str]:
+    """Apply sentence_reversal, or sentence_reversal_with_punctuation if
+    punctuation is True, to each sentence in a list.
+
+    Arguments:
+        sentences : List[str]
+            input sentences
+        punctuation : bool
+            whether to preserve capitalization and the final punctuation mark
+
+    Returns:
+        List[str]: the sentences with the order of their words reversed
+    """
+    if punctuation:
+        return list(map(sentence_reversal_with_punctuation, sentences))
+    return list(map(sentence_reversal, sentences))
+
+
+def sentence_reversal_batch(sentences: Iterable[str],
+                            punctuation: bool = False,
+                            processes: Optional[int] = None,
+                            chunk_size: int = 10000) -> Iterator[str]:
+    """Reverse the order of words in each of many sentences using a process
+    pool, yielding the results in the order of the input.
+
+    The sentences are sent to the workers in chunks of chunk_size so that the
+    cost of each call is amortized across a chunk, and at most two chunks per
+    worker are in flight at once so that memory use does not depend on the
+    number of sentences.  With a single process the chunks are reversed in
+    this process instead.  If the iterator is closed early, or interrupted,
+    the chunks not yet started are cancelled and the call returns without
+    waiting for the running ones.
+
+    Arguments:
+        sentences : Iterable[str]
+            input sentences
+        punctuation : bool
+            if True use sentence_reversal_with_punctuation, otherwise
+            sentence_reversal
+        processes : Optional[int]
+            number of worker processes, or None to use one per CPU
+        chunk_size : int
+            number of sentences sent to a worker at a time
+
+    Returns:
+        Iterator[str]: the sentences with the order of their words reversed
+    """
+    if processes is None:
+        processes = cpu_count()
+    iterator = iter(sentences)
+    if processes <= 1:
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield from _reverse_sentences(chunk, punctuation)
+    pending = deque()
+    executor = ProcessPoolExecutor(max_workers=processes)
+    try:
+        while True:
+            while len(pending) < 2 * processes:
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                pending.append(
+                    executor.submit(_reverse_sentences, chunk, punctuation))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def sentence_spans(p: str) -> array:
+    """Find the sentences of a paragraph with a compiled regular expression.
+
+    The whitespace between sentences after the first character of it is left
+    out of the spans, but a sentence still spans any extra whitespace after a
+    break that does not end it, such as 'e.g.  x', which paragraph_reversal
+    drops.
+
+    Arguments:
+        p : str
+            input paragraph
+
+    Returns:
+        array: array('Q') of start and end offsets, such that sentence i is
+            p[spans[2 * i]:spans[2 * i + 1]]
+    """
+    return _segment(p)[0]
+
+
+class Document(object):
+    """A paragraph segmented once into sentence and word offsets, which then
+    answers any number of reversal queries without tokenizing it again.
+
+    Arguments:
+        text : str
+            input paragraph
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.sentences, self._gaps = _segment(text)
+        self._compact = None
+        self._words = None
+
+    @property
+    def words(self) -> array:
+        """array('Q') of start and end offsets of the words, delimited by
+        whitespace, computed on first use."""
+        if self._words is None:
+            self._words = array('Q', chain.from_iterable(
+                match.span() for match in _WORD.finditer(self.text)))
+        return self._words
+
+    def sentence_count(self) -> int:
+        """Return the number of sentences in the document."""
+        return len(self.sentences) // 2
+
+    def word_count(self) -> int:
+        """Return the number of words in the document."""
+        return len(self.words) // 2
+
+    def reverse_sentences(self,
+                          start: int = 0,
+                          stop: Optional[int] = None) -> str:
+        """Reverse the order of sentences start to stop - 1 of the document,
+        as paragraph_reversal would if given only those sentences.  If stop
+        is before the last sentence, the whitespace ending sentence stop - 1
+        is dropped, so that it is followed by a single space.
+
+        Arguments:
+            start : int
+                index of the first sentence
+            stop : Optional[int]
+                index after the last sentence, or None for the end of the
+                document
+
+        Returns:
+            str: the sentences in reverse order
+        """
+        spans = self.sentences
+        start, stop, _ = slice(start, stop).indices(len(spans) // 2)
+        if start >= stop:
+            return ''
+        text = self.text
+        if len(self._gaps) > 0:
+            if self._compact is None:
+                self._compact = _drop_gaps(text, spans, self._gaps)
+            text, spans = self._compact
+        sentences = list(map(text.__getitem__, map(
+            slice, spans[2 * start:2 * stop:2],
+            spans[2 * start + 1:2 * stop:2])))
+        last = sentences[-1]
+        if stop < len(spans) // 2:
+            last = last.rstrip()
+        return last + ' ' + ''.join(sentences[-2::-1])
+
+    def reverse_words(self, start: int = 0, stop: Optional[int] = None) -> str:
+        """Reverse the order of words start to stop - 1 of the document, as
+        sentence_reversal would if given only those words.
+
+        Arguments:
+            start : int
+                index of the first word
+            stop : Optional[int]
+                index after the last word, or None for the end of the
+                document
+
+        Returns:
+            str: the words in reverse order separated by single spaces
+        """
+        spans = self.words
+        start, stop, _ = slice(start, stop).indices(len(spans) // 2)
+        return ' '.join([self.text[spans[i]:spans[i + 1]]
+                         for i in range(2 * stop - 2, 2 * start - 2, -2)])
+
+
+def document(text: str) -> Document:
+    """Return the Document for a paragraph, reusing the one built by an
+    earlier call if it is among the DOCUMENT_CACHE_SIZE most recently used.
+    The least recently used Documents are also dropped while their text is
+    longer than DOCUMENT_CACHE_CHARACTERS in total, and a longer paragraph is
+    not kept at all.
+
+    Arguments:
+        text : str
+            input paragraph
+
+    Returns:
+        Document: the segmented paragraph
+    """
+    global _document_characters
+    doc = _documents.get(text)
+    if doc is None:
+        doc = Document(text)
+        if len(text) <= DOCUMENT_CACHE_CHARACTERS:
+            _documents[text] = doc
+            _document_characters += len(text)
+            while (len(_documents) > DOCUMENT_CACHE_SIZE or
+                   _document_characters > DOCUMENT_CACHE_CHARACTERS):
+                _document_characters -= len(_documents.popitem(last=False)[0])
+    else:
+        _documents.move_to_end(text)
+    return doc
 
 
 def paragraph_reversal(p: str) -> str:
     """Reverse the order of sentences in a paragraph.
 
-    This function can run in O(n) time.  Because Python requires returning a
-    new copy of a string and not a pointer, this function does not technically
-    perform the operation in place.
+    This function can run in O(n) time.  The sentence breaks are found by a
+    compiled regular expression, with one Python step per break rather than
+    per character, and the sentences are joined in reverse order from their
+    offsets.  The paragraph is segmented through document(), so reversing the
+    same paragraph again reuses its cached offsets.
 
     Arguments:
         p : str
@@ -89,37 +498,112 @@ def paragraph_reversal(p: str) -> str:
     Returns:
         str: the paragraph with the order of sentences reversed
     """
-    sentence_breaks = ['.', '?', '!']
-    sentences = []
-    sentence = []
-    state = 'normal_text'
-    for i in range(len(p)):
-        if state == 'normal_text':
-            sentence.append(p[i])
-            if p[i] in sentence_breaks:
-                state = 'punctuation'
-        elif state == 'punctuation':
-            sentence.append(p[i])
-            if p[i].strip() != '':
-                state = 'normal_text'
-            else:
-                state = 'white_space'
-        elif state == 'white_space':
-            if p[i].strip() == '':
-                continue
-            elif p[i].upper() == p[i]:
-                sentences.append(''.join(sentence))
-                sentence = [p[i]]
-            state = 'normal_text'
-    if sentence[-1].strip != '':
-        sentences.append(' ')
-    sentences.append(''.join(sentence))
-    for i in range(int(len(sentences)/2)):
-        temp = sentences[i]
-        sentences[i] = sentences[len(sentences) - 1 - i]
-        sentences[len(sentences) - 1 - i] = temp
-    return ''.join(sentences)
-    
+    return document(p).reverse_sentences()
+
+
+def _spool_sentences(source: IO[str],
+                     spool: IO[bytes],
+                     index: IO[bytes],
+                     chunk_size: int) -> int:
+    """Read a paragraph from source in chunks, write its sentences one after
+    another to spool as UTF-8 and the byte offset at which each sentence after
+    the first starts to index as an array('Q').
+
+    Arguments:
+        source : IO[str]
+            text stream to read the paragraph from
+        spool : IO[bytes]
+            binary file to write the sentences to
+        index : IO[bytes]
+            binary file to write the sentence offsets to
+        chunk_size : int
+            number of characters to read at a time
+
+    Returns:
+        int: total number of bytes written to spool
+    """
+    offset = 0
+    carry = ''
+    starts = array('Q')
+    while True:
+        chunk = source.read(chunk_size)
+        buffer = carry + chunk
+        end = len(buffer)
+        pending = _PENDING_BREAK.search(buffer) if chunk else None
+        if pending:
+            end = pending.start()
+        spans, gaps = _segment(buffer)
+        text, spans = _drop_gaps(buffer, spans, gaps)
+        stop = len(text) - (len(buffer) - end)
+        for i in range(0, len(spans), 2):
+            if i > 0:
+                starts.append(offset)
+            sentence = text[spans[i]:min(spans[i + 1], stop)].encode('utf-8')
+            spool.write(sentence)
+            offset += len(sentence)
+        carry = buffer[end:]
+        if len(starts) >= chunk_size or not chunk:
+            starts.tofile(index)
+            starts = array('Q')
+        if not chunk:
+            return offset
+
+
+def paragraph_reversal_stream(source: Union[str, IO[str]],
+                              destination: Union[str, IO[str]],
+                              chunk_size: int = 1 << 20) -> None:
+    """Reverse the order of sentences in a paragraph read from a file and write
+    the result to another file, producing the same text as paragraph_reversal.
+
+    The paragraph is read chunk_size characters at a time, carrying over any
+    sentence break whose following character lies in the next chunk.  The
+    sentences are spooled to a temporary file and their offsets to a
+    temporary on-disk index, which is then walked backwards to write the
+    output, so memory use is bounded by chunk_size rather than the size of the
+    paragraph.
+
+    Arguments:
+        source : Union[str, IO[str]]
+            path of a UTF-8 text file or text stream containing the paragraph
+        destination : Union[str, IO[str]]
+            path of a file or text stream to write the reversed paragraph to
+        chunk_size : int
+            number of characters to read and write at a time
+    """
+    if isinstance(source, str):
+        with open(source, encoding='utf-8') as f:
+            return paragraph_reversal_stream(f, destination, chunk_size)
+    if isinstance(destination, str):
+        with open(destination, 'w', encoding='utf-8') as f:
+            return paragraph_reversal_stream(source, f, chunk_size)
+    with TemporaryFile() as spool, TemporaryFile() as index:
+        end = _spool_sentences(source, spool, index, chunk_size)
+        if end == 0:
+            return
+        decoder = getincrementaldecoder('utf-8')()
+        item_size = array('Q').itemsize
+        remaining = index.tell() // item_size
+        starts = []
+        separator = ' '
+        while True:
+            if not starts and remaining > 0:
+                count = min(remaining, chunk_size)
+                remaining -= count
+                block = array('Q')
+                index.seek(remaining * item_size)
+                block.fromfile(index, count)
+                starts = block.tolist()
+            start = starts.pop() if starts else 0
+            spool.seek(start)
+            for _ in range(start, end, chunk_size):
+                destination.write(decoder.decode(
+                    spool.read(min(chunk_size, end - spool.tell()))))
+            destination.write(separator)
+            separator = ''
+            end = start
+            if end == 0:
+                return
+
 
 if __name__ == '__main__':
     # Problem 1: